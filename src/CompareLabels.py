@@ -0,0 +1,223 @@
+import os
+import csv
+import json
+import argparse
+import multiprocessing
+from itertools import combinations, islice
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from LabelIO import read_boxes_array
+
+# The Hungarian matcher is optional, a greedy matcher is used without scipy
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:
+    linear_sum_assignment = None
+
+BATCH_SIZE = 4096  # Images handed to the worker pool at once
+
+def to_corners(boxes):
+    """Convert [n, 5] YOLO rows to [n, 4] x1, y1, x2, y2 corners"""
+    centers = boxes[:, 1:3]
+    half = boxes[:, 3:5] / 2
+    return np.concatenate([centers - half, centers + half], axis=1)
+
+def iou_matrix(boxes_a, boxes_b):
+    """IoU of every box in boxes_a with every box in boxes_b, both YOLO rows"""
+    a = to_corners(boxes_a)[:, None, :]
+    b = to_corners(boxes_b)[None, :, :]
+    top_left = np.maximum(a[..., :2], b[..., :2])
+    bottom_right = np.minimum(a[..., 2:], b[..., 2:])
+    intersection = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    area_a = np.prod(a[..., 2:] - a[..., :2], axis=2)
+    area_b = np.prod(b[..., 2:] - b[..., :2], axis=2)
+    union = area_a + area_b - intersection
+    return np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+
+def match_boxes(ious, threshold):
+    """Return (rows, cols) of matched boxes with an IoU of at least threshold"""
+    if ious.size == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    if linear_sum_assignment is not None:
+        rows, cols = linear_sum_assignment(ious, maximize=True)
+    else:
+        # Greedy: take the best remaining pair until no pair is above the threshold
+        order = np.argsort(ious, axis=None)[::-1]
+        used_rows, used_cols = set(), set()
+        rows, cols = [], []
+        for flat in order:
+            row, col = divmod(int(flat), ious.shape[1])
+            if ious[row, col] < threshold:
+                break
+            if row in used_rows or col in used_cols:
+                continue
+            used_rows.add(row)
+            used_cols.add(col)
+            rows.append(row)
+            cols.append(col)
+        rows, cols = np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64)
+
+    keep = ious[rows, cols] >= threshold
+    return rows[keep], cols[keep]
+
+def consensus_boxes(box_sets, threshold, min_votes):
+    """Merge the boxes of several annotators into one set
+
+    Boxes of each annotator are matched against the running mean of the clusters found
+    so far. A cluster is kept when at least min_votes annotators contributed, its class
+    is the majority vote and its coordinates are the mean of the member boxes.
+    """
+    clusters = [[box] for box in box_sets[0]]
+    for boxes in box_sets[1:]:
+        matched = set()
+        if clusters and len(boxes):
+            means = np.stack([np.mean(cluster, axis=0) for cluster in clusters])
+            rows, cols = match_boxes(iou_matrix(means, boxes), threshold)
+            for row, col in zip(rows, cols):
+                clusters[row].append(boxes[col])
+                matched.add(int(col))
+        clusters.extend([box] for i, box in enumerate(boxes) if i not in matched)
+
+    merged = []
+    for cluster in clusters:
+        if len(cluster) < min_votes:
+            continue
+        members = np.stack(cluster)
+        class_id = np.bincount(members[:, 0].astype(np.int64)).argmax()
+        merged.append(np.concatenate([[class_id], members[:, 1:].mean(axis=0)]))
+    return np.asarray(merged, dtype=np.float32).reshape(-1, 5)
+
+def compare_image(job):
+    """Compare the label sets of one image and write its consensus labels (runs in a worker process)"""
+    stem, label_folders, output_folder, threshold, min_votes = job
+    box_sets = []
+    for folder in label_folders:
+        txt_path = os.path.join(folder, f"{stem}.txt")
+        box_sets.append(read_boxes_array(txt_path) if os.path.exists(txt_path)
+                        else np.zeros((0, 5), dtype=np.float32))
+
+    pairs = []
+    class_counts = {}  # (pair index, class id) -> [boxes in a, boxes in b, agreed]
+    for pair, (i, j) in enumerate(combinations(range(len(box_sets)), 2)):
+        boxes_a, boxes_b = box_sets[i], box_sets[j]
+        ious = iou_matrix(boxes_a, boxes_b)
+        rows, cols = match_boxes(ious, threshold)
+        same_class = boxes_a[rows, 0] == boxes_b[cols, 0]
+        pairs.append({
+            'matched': len(rows),
+            'agreed': int(same_class.sum()),
+            'mean_iou': float(ious[rows, cols].mean()) if len(rows) else 0.0
+        })
+
+        for class_id in np.unique(np.concatenate([boxes_a[:, 0], boxes_b[:, 0]])).astype(np.int64):
+            class_counts[(pair, int(class_id))] = [
+                int((boxes_a[:, 0] == class_id).sum()),
+                int((boxes_b[:, 0] == class_id).sum()),
+                int((boxes_a[rows, 0][same_class] == class_id).sum())
+            ]
+
+    merged = consensus_boxes(box_sets, threshold, min_votes)
+    with open(os.path.join(output_folder, f"{stem}.txt"), 'w') as f:
+        for class_id, x_center, y_center, width, height in merged:
+            f.write(f"{int(class_id)} {x_center:.6f} {y_center:.6f} {width:.6f} {height:.6f}\n")
+
+    return stem, [len(boxes) for boxes in box_sets], pairs, class_counts, len(merged)
+
+def agreement(count_a, count_b, agreed):
+    """F1-style agreement between two annotators, 1.0 when neither drew a box"""
+    total = count_a + count_b
+    return 2 * agreed / total if total else 1.0
+
+def compare_label_sets(label_folders, output_folder, threshold=0.5, min_votes=None, workers=None):
+    """Compare two or more label folders, write a per-image CSV, a per-class JSON and consensus labels"""
+    names = [os.path.basename(os.path.normpath(folder)) for folder in label_folders]
+    pair_names = [f"{names[i]}-{names[j]}" for i, j in combinations(range(len(names)), 2)]
+    if min_votes is None:
+        min_votes = len(label_folders) // 2 + 1  # Majority of the annotators
+
+    consensus_folder = os.path.join(output_folder, "labels")
+    os.makedirs(consensus_folder, exist_ok=True)
+
+    stems = set()
+    for folder in label_folders:
+        stems.update(os.path.splitext(name)[0] for name in os.listdir(folder) if name.endswith('.txt'))
+    stems = sorted(stems)
+
+    totals = [{'matched': 0, 'agreed': 0, 'iou_sum': 0.0, 'boxes_a': 0, 'boxes_b': 0} for _ in pair_names]
+    class_totals = {}  # (pair index, class id) -> [boxes in a, boxes in b, agreed]
+    consensus_count = 0
+
+    jobs = ((stem, label_folders, consensus_folder, threshold, min_votes) for stem in stems)
+    context = multiprocessing.get_context("spawn")
+    with open(os.path.join(output_folder, "per_image.csv"), 'w', newline='') as csv_file, \
+            ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        writer = csv.writer(csv_file)
+        header = ['image'] + [f"boxes_{name}" for name in names]
+        for pair_name in pair_names:
+            header += [f"{pair_name}_matched", f"{pair_name}_agreement", f"{pair_name}_mean_iou"]
+        writer.writerow(header + ['consensus_boxes'])
+
+        # Submit in batches so the result rows can be streamed to the CSV
+        while True:
+            batch = list(islice(jobs, BATCH_SIZE))
+            if not batch:
+                break
+            for stem, counts, pairs, class_counts, merged in pool.map(compare_image, batch, chunksize=128):
+                row = [stem] + counts
+                for pair, ((i, j), stats) in enumerate(zip(combinations(range(len(names)), 2), pairs)):
+                    total = totals[pair]
+                    total['matched'] += stats['matched']
+                    total['agreed'] += stats['agreed']
+                    total['iou_sum'] += stats['mean_iou'] * stats['matched']
+                    total['boxes_a'] += counts[i]
+                    total['boxes_b'] += counts[j]
+                    row += [stats['matched'], f"{agreement(counts[i], counts[j], stats['agreed']):.4f}",
+                            f"{stats['mean_iou']:.4f}"]
+                writer.writerow(row + [merged])
+
+                for key, (count_a, count_b, agreed) in class_counts.items():
+                    class_total = class_totals.setdefault(key, [0, 0, 0])
+                    class_total[0] += count_a
+                    class_total[1] += count_b
+                    class_total[2] += agreed
+                consensus_count += merged
+
+    summary = {'images': len(stems), 'iou_threshold': threshold, 'min_votes': min_votes,
+               'consensus_boxes': consensus_count, 'pairs': {}}
+    for pair, pair_name in enumerate(pair_names):
+        total = totals[pair]
+        summary['pairs'][pair_name] = {
+            'matched': total['matched'],
+            'agreement': agreement(total['boxes_a'], total['boxes_b'], total['agreed']),
+            'mean_iou': total['iou_sum'] / total['matched'] if total['matched'] else 0.0,
+            'classes': {
+                str(class_id): {
+                    'boxes': [count_a, count_b],
+                    'agreement': agreement(count_a, count_b, agreed)
+                }
+                for (class_pair, class_id), (count_a, count_b, agreed) in sorted(class_totals.items())
+                if class_pair == pair
+            }
+        }
+    with open(os.path.join(output_folder, "summary.json"), 'w') as f:
+        json.dump(summary, f, indent=2)
+
+    for pair_name, stats in summary['pairs'].items():
+        print(f"{pair_name}: agreement {stats['agreement']:.3f}, mean IoU {stats['mean_iou']:.3f}")
+    print(f"Wrote {consensus_count} consensus boxes for {len(stems)} images to {consensus_folder}")
+    return summary
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the YOLO labels of several annotators and merge them")
+    parser.add_argument('labels', nargs='+', help="Two or more label folders of the same images")
+    parser.add_argument('--output', default='Datasets/consensus', help="Folder for the report and consensus labels")
+    parser.add_argument('--iou', type=float, default=0.5, help="Minimum IoU for two boxes to match")
+    parser.add_argument('--min-votes', type=int, default=None, help="Annotators needed to keep a box, defaults to a majority")
+    parser.add_argument('--workers', type=int, default=None, help="Number of worker processes")
+    args = parser.parse_args()
+
+    if len(args.labels) < 2:
+        parser.error("at least two label folders are needed")
+    compare_label_sets(args.labels, args.output, args.iou, args.min_votes, args.workers)
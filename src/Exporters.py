@@ -0,0 +1,197 @@
+import os
+import json
+import shutil
+import argparse
+import tempfile
+import multiprocessing
+import xml.etree.ElementTree as ET
+from itertools import islice
+from xml.dom import minidom
+from concurrent.futures import ProcessPoolExecutor
+
+from ImageProbe import dataset_size_cache
+from LabelIO import index_images, iter_label_stems, load_pixel_boxes
+
+# Number of VOC files handed to the worker pool at once
+VOC_BATCH_SIZE = 1024
+
+def clamp_box(box, width, height):
+    """Clip a pixel box to the image, returned as [x, y, width, height]"""
+    x1 = max(0, box['x'])
+    y1 = max(0, box['y'])
+    x2 = min(width, box['x'] + box['width'])
+    y2 = min(height, box['y'] + box['height'])
+    return [x1, y1, max(0, x2 - x1), max(0, y2 - y1)]
+
+def export_coco(dataset_folder, output_path, size_cache=None):
+    """Stream all labels of a dataset into a single COCO JSON file
+
+    Images are written straight to the output while annotations are spooled to
+    a temporary file, so neither the document nor the box list is kept in memory.
+    The document is streamed to a .tmp file and only replaces output_path once complete.
+    """
+    images_folder = os.path.join(dataset_folder, "images")
+    labels_folder = os.path.join(dataset_folder, "labels")
+    size_cache = size_cache or dataset_size_cache(dataset_folder)
+    image_index = index_images(images_folder)
+
+    categories = {}  # label name -> category id
+    image_count = 0
+    annotation_count = 0
+    skipped = 0
+
+    tmp_path = output_path + '.tmp'
+    try:
+        with open(tmp_path, 'w') as out, tempfile.TemporaryFile('w+') as annotations_tmp:
+            out.write('{"info": {"description": "YoloLabeler export"}, "images": [')
+
+            for stem in iter_label_stems(labels_folder):
+                image_path = image_index.get(stem)
+                if image_path is None:
+                    print(f"No image found for {stem}, skipping")
+                    skipped += 1
+                    continue
+
+                try:
+                    width, height = size_cache.get(image_path)
+                    boxes = load_pixel_boxes(labels_folder, stem, lambda: (width, height))
+                except (OSError, ValueError, KeyError) as e:
+                    print(f"Could not read {stem}, skipping: {str(e)}")
+                    skipped += 1
+                    continue
+
+                image_count += 1
+                out.write(',' if image_count > 1 else '')
+                json.dump({
+                    'id': image_count,
+                    'file_name': os.path.basename(image_path),
+                    'width': width,
+                    'height': height
+                }, out)
+
+                for box in boxes:
+                    bbox = clamp_box(box, width, height)
+                    category_id = categories.setdefault(box['label'], len(categories) + 1)
+                    annotation_count += 1
+                    annotations_tmp.write(',' if annotation_count > 1 else '')
+                    json.dump({
+                        'id': annotation_count,
+                        'image_id': image_count,
+                        'category_id': category_id,
+                        'bbox': bbox,
+                        'area': bbox[2] * bbox[3],
+                        'iscrowd': 0
+                    }, annotations_tmp)
+
+            out.write('], "annotations": [')
+            annotations_tmp.seek(0)
+            shutil.copyfileobj(annotations_tmp, out)
+
+            # Categories are only known at the end, JSON does not care about key order
+            out.write('], "categories": ')
+            json.dump([{'id': category_id, 'name': name} for name, category_id in categories.items()], out)
+            out.write('}')
+    except BaseException:
+        # Do not leave a truncated document behind
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    os.replace(tmp_path, output_path)
+    size_cache.save()
+    print(f"Exported {image_count} images and {annotation_count} annotations to {output_path} "
+          f"({skipped} skipped)")
+    return image_count, annotation_count
+
+def _write_voc_file(job):
+    """Build and write the Pascal VOC XML of one image (runs in a worker process)"""
+    labels_folder, stem, image_path, width, height, output_folder = job
+    try:
+        boxes = load_pixel_boxes(labels_folder, stem, lambda: (width, height))
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Could not read labels of {stem}, skipping: {str(e)}")
+        return None
+
+    root = ET.Element('annotation')
+    ET.SubElement(root, 'folder').text = os.path.basename(os.path.dirname(image_path))
+    ET.SubElement(root, 'filename').text = os.path.basename(image_path)
+    ET.SubElement(root, 'path').text = image_path
+    source = ET.SubElement(root, 'source')
+    ET.SubElement(source, 'database').text = 'YoloLabeler'
+    size = ET.SubElement(root, 'size')
+    ET.SubElement(size, 'width').text = str(width)
+    ET.SubElement(size, 'height').text = str(height)
+    ET.SubElement(size, 'depth').text = '3'
+    ET.SubElement(root, 'segmented').text = '0'
+
+    for box in boxes:
+        obj = ET.SubElement(root, 'object')
+        ET.SubElement(obj, 'name').text = box['label']
+        ET.SubElement(obj, 'pose').text = 'Unspecified'
+        ET.SubElement(obj, 'truncated').text = '0'
+        ET.SubElement(obj, 'difficult').text = '0'
+        x, y, box_width, box_height = clamp_box(box, width, height)
+        bndbox = ET.SubElement(obj, 'bndbox')
+        ET.SubElement(bndbox, 'xmin').text = str(x)
+        ET.SubElement(bndbox, 'ymin').text = str(y)
+        ET.SubElement(bndbox, 'xmax').text = str(x + box_width)
+        ET.SubElement(bndbox, 'ymax').text = str(y + box_height)
+
+    xml_string = minidom.parseString(ET.tostring(root)).toprettyxml(indent="  ")
+    with open(os.path.join(output_folder, f"{stem}.xml"), 'w') as f:
+        f.write(xml_string)
+    return len(boxes)
+
+def export_voc(dataset_folder, output_folder, workers=None, size_cache=None):
+    """Write one Pascal VOC XML file per labeled image using a pool of worker processes"""
+    images_folder = os.path.join(dataset_folder, "images")
+    labels_folder = os.path.join(dataset_folder, "labels")
+    size_cache = size_cache or dataset_size_cache(dataset_folder)
+    image_index = index_images(images_folder)
+    os.makedirs(output_folder, exist_ok=True)
+
+    def jobs():
+        for stem in iter_label_stems(labels_folder):
+            image_path = image_index.get(stem)
+            if image_path is None:
+                print(f"No image found for {stem}, skipping")
+                continue
+            try:
+                width, height = size_cache.get(image_path)
+            except (OSError, ValueError) as e:
+                print(f"Could not read {stem}, skipping: {str(e)}")
+                continue
+            yield labels_folder, stem, image_path, width, height, output_folder
+
+    file_count = 0
+    box_count = 0
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        # Submit in batches so the job list never has to be built in memory
+        job_iter = jobs()
+        while True:
+            batch = list(islice(job_iter, VOC_BATCH_SIZE))
+            if not batch:
+                break
+            for boxes in pool.map(_write_voc_file, batch, chunksize=64):
+                if boxes is None:
+                    continue
+                file_count += 1
+                box_count += boxes
+
+    size_cache.save()
+    print(f"Exported {file_count} VOC files with {box_count} objects to {output_folder}")
+    return file_count, box_count
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the labels of a dataset to COCO or Pascal VOC")
+    parser.add_argument('format', choices=['coco', 'voc'])
+    parser.add_argument('dataset', nargs='?', default='Datasets/Stag', help="Dataset folder containing images/ and labels/")
+    parser.add_argument('--output', help="COCO JSON file or VOC output folder")
+    parser.add_argument('--workers', type=int, default=None, help="Number of VOC worker processes")
+    args = parser.parse_args()
+
+    if args.format == 'coco':
+        export_coco(args.dataset, args.output or os.path.join(args.dataset, "annotations_coco.json"))
+    else:
+        export_voc(args.dataset, args.output or os.path.join(args.dataset, "annotations_voc"), args.workers)
@@ -2,13 +2,22 @@ import sys
 import os
 import shutil
 import json
-from PyQt5.QtCore import Qt, QFile, QTextStream, QFileInfo, QRect, QPoint, QSize, QModelIndex
-from PyQt5.QtGui import QPixmap, QPainter, QColor, QPen, QCursor
+import cv2
+from PyQt5.QtCore import Qt, QFile, QTextStream, QFileInfo, QRect, QPoint, QSize, QModelIndex, QTimer, pyqtSignal
+from PyQt5.QtGui import QPixmap, QImage, QPainter, QColor, QPen, QCursor
 from PyQt5.QtWidgets import (QApplication, QWidget, QVBoxLayout, QHBoxLayout, QTreeView, 
                             QFileSystemModel, QLabel, QTextEdit, QPushButton, QMenu, 
-                            QAction, QMessageBox, QInputDialog, QFileDialog)
+                            QAction, QMessageBox, QInputDialog, QFileDialog, QSlider)
+from VideoSource import VideoFrameSource, is_video_file, frame_stem
+from Thumbnails import ThumbnailStrip
+from TextViewer import LargeFileView
+from TaskScheduler import get_scheduler, shutdown_scheduler, FOREGROUND
+from LabelIO import LabelCache
 
 class FileExplorer(QWidget):
+    image_decoded = pyqtSignal(int, object)  # selection token, Future with the decoded QImage
+    video_index_built = pyqtSignal(str)  # video path whose exact frame count is now known
+
     def __init__(self):
         super().__init__()
         self.initUI()
@@ -19,6 +28,13 @@ class FileExplorer(QWidget):
         self.image_size = QSize()  # Store the original image size
         self.scaled_image = None  # Store the scaled image
         self.current_file_path = None  # Track the currently selected file
+        self.label_stem = None  # Name of the label files of the displayed image or frame
+        self.video = None  # Open VideoFrameSource when labeling a video
+        self.frame_id = None  # Displayed frame of the open video
+        self.selection_token = 0  # Bumped on every selection so late background decodes can be dropped
+        self.label_cache = LabelCache()  # Parsed label files, so flipping between images never re-parses them
+        self.image_decoded.connect(self.on_image_decoded)
+        self.video_index_built.connect(self.on_video_index_built)
 
     def initUI(self):
         self.setWindowTitle("Advanced File Explorer with Annotations")
@@ -57,10 +73,31 @@ class FileExplorer(QWidget):
         self.image_display.setText("Select an image file")
         self.image_display.setStyleSheet("border: 1px solid #cccccc;")
 
-        # Json display
-        self.json_display = QLabel(self)
-        self.json_display.setAlignment(Qt.AlignLeft)
-        self.json_display.setText("Select an json file")
+        # Video frame navigation, only shown while a video is open
+        frame_layout = QHBoxLayout()
+        self.prev_frame_button = QPushButton("< Frame", self)
+        self.prev_frame_button.clicked.connect(lambda: self.step_frame(-1))
+        frame_layout.addWidget(self.prev_frame_button)
+
+        self.frame_slider = QSlider(Qt.Horizontal, self)
+        self.frame_slider.setTracking(False)  # Only decode once the slider is released
+        self.frame_slider.valueChanged.connect(self.display_frame)
+        frame_layout.addWidget(self.frame_slider)
+
+        self.next_frame_button = QPushButton("Frame >", self)
+        self.next_frame_button.clicked.connect(lambda: self.step_frame(1))
+        frame_layout.addWidget(self.next_frame_button)
+
+        self.frame_label = QLabel(self)
+        frame_layout.addWidget(self.frame_label)
+
+        self.frame_widget = QWidget(self)
+        self.frame_widget.setLayout(frame_layout)
+        self.frame_widget.hide()
+
+        # Json display, the file is memory-mapped so large label files open instantly
+        self.json_display = LargeFileView(self)
+        self.json_display.show_message("Select an json file")
         self.json_display.setStyleSheet("border: 1px solid #cccccc;")
 
         # Annotation information display
@@ -94,6 +131,7 @@ class FileExplorer(QWidget):
         
         image_panel = QVBoxLayout()
         image_panel.addWidget(self.image_display)
+        image_panel.addWidget(self.frame_widget)
         image_panel.addWidget(self.json_display)
         image_panel.addWidget(self.info_display)
         image_panel.addLayout(btn_layout)
@@ -102,8 +140,13 @@ class FileExplorer(QWidget):
         h_layout.addLayout(file_panel, 1)
         h_layout.addLayout(image_panel, 2)
 
+        # Filmstrip with the thumbnails of the folder of the displayed image
+        self.filmstrip = ThumbnailStrip(self)
+        self.filmstrip.image_activated.connect(self.select_file)
+
         main_layout = QVBoxLayout()
         main_layout.addLayout(h_layout)
+        main_layout.addWidget(self.filmstrip)
 
         self.setLayout(main_layout)
         self.drawing = False
@@ -112,7 +155,18 @@ class FileExplorer(QWidget):
         # Status message
         self.status_label = QLabel("Ready")
         self.status_label.setFixedHeight(20)
-        main_layout.addWidget(self.status_label)
+
+        # Queue depth and utilization of the background workers
+        self.metrics_label = QLabel(self)
+        self.metrics_label.setFixedHeight(20)
+        self.metrics_timer = QTimer(self)
+        self.metrics_timer.timeout.connect(self.update_scheduler_metrics)
+        self.metrics_timer.start(1000)
+
+        status_layout = QHBoxLayout()
+        status_layout.addWidget(self.status_label, 1)
+        status_layout.addWidget(self.metrics_label)
+        main_layout.addLayout(status_layout)
 
     def show_context_menu(self, position):
         indexes = self.tree.selectedIndexes()
@@ -303,20 +357,31 @@ class FileExplorer(QWidget):
         index = indexes[0]
         file_path = self.model.filePath(index)
         self.current_file_path = file_path
+        self.selection_token += 1
 
         # Clear any previous content
         self.image_display.clear()
+        self.close_video()
         
         # Check if the selected file is a directory
         if QFileInfo(file_path).isDir():
             self.image_display.setText("Select a file to display")
             self.rectangles.clear()
             self.update_annotation_info()
+
+            # Browse the images of the folder in the filmstrip, its parent is the dataset folder.
+            # Folders without images leave the filmstrip as it is
+            try:
+                self.filmstrip.set_folder(file_path, os.path.dirname(file_path))
+            except OSError as e:
+                self.status_label.setText(f"Could not list folder: {str(e)}")
             return
 
         # If the file is an image, display it
         if self.is_image_file(file_path):
             self.display_image(file_path)
+        elif is_video_file(file_path):
+            self.open_video(file_path)
         elif file_path.lower().endswith('.json'):
             # If it's a JSON file, read and display its content
             self.display_json(file_path)
@@ -324,6 +389,12 @@ class FileExplorer(QWidget):
             # If it's not an image or JSON file, show a default message
             self.image_display.setText("Selected file is not an image or JSON")
                 
+    def select_file(self, file_path):
+        """Select a file in the tree view, which displays it"""
+        index = self.model.index(file_path)
+        self.tree.setCurrentIndex(index)
+        self.tree.scrollTo(index)
+
     def is_image_file(self, file_path):
             return any(file_path.lower().endswith(ext) for ext in ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff'])
             
@@ -336,7 +407,7 @@ class FileExplorer(QWidget):
             
     def export_coordinates(self):
         """Export the coordinates of all bounding boxes with labels to a JSON file"""
-        if not self.rectangles or not self.current_file_path:
+        if not self.rectangles or not self.current_file_path or self.current_image is None:
             QMessageBox.information(self, "Export", "No annotations to export")
             return
 
@@ -345,11 +416,24 @@ class FileExplorer(QWidget):
         os.makedirs(labels_folder, exist_ok=True)  # Create if doesn't exist
 
         # JSON and YOLO format file paths
-        base_name = os.path.splitext(os.path.basename(self.current_file_path))[0]
+        base_name = self.label_stem
         json_path = os.path.join(labels_folder, f"{base_name}.json")
         txt_path = os.path.join(labels_folder, f"{base_name}.txt")
 
+        # The viewer may still map the label file that is about to be rewritten
+        self.json_display.close_file()
+
         try:
+            image_reference = self.current_file_path
+            annotated_name = os.path.basename(self.image_path)
+            if self.video is not None:
+                # Only frames that are actually labeled are written to disk
+                images_folder = os.path.join(self.parent_folder, "images")
+                os.makedirs(images_folder, exist_ok=True)
+                annotated_name = f"{base_name}.png"
+                image_reference = os.path.join(images_folder, annotated_name)
+                self.video.materialize_frame(self.frame_id, image_reference)
+
             # Ensure JSON file exists before writing
             if not os.path.exists(json_path):
                 with open(json_path, 'w') as f:
@@ -373,7 +457,7 @@ class FileExplorer(QWidget):
             # Save to JSON file
             with open(json_path, 'w') as f:
                 json.dump({
-                    'image': self.current_file_path,
+                    'image': image_reference,
                     'size': {
                         'width': self.image_size.width(),
                         'height': self.image_size.height()
@@ -395,11 +479,12 @@ class FileExplorer(QWidget):
                     f.write(f"0 {x_center:.6f} {y_center:.6f} {width:.6f} {height:.6f}\n")
 
             self.status_label.setText(f"Annotations exported to {os.path.basename(json_path)}")
+            self.display_json(json_path)
 
             annotated_folder = os.path.join(self.parent_folder, "annotated_images")
             if not os.path.exists(annotated_folder):
                 os.makedirs(annotated_folder)
-            annotated_path = os.path.join(annotated_folder, os.path.basename(self.image_path))
+            annotated_path = os.path.join(annotated_folder, annotated_name)
             self.image_display.pixmap().save(annotated_path)
             print(f"Annotated image saved at: {annotated_path}")
 
@@ -407,14 +492,108 @@ class FileExplorer(QWidget):
             QMessageBox.warning(self, "Export Error", f"Failed to export annotations: {str(e)}")
 
     def display_image(self, file_path):
-        self.current_image = QPixmap(file_path)
         self.image_path = file_path  # Store file path for saving annotated image
         self.image_folder = os.path.dirname(file_path)  # Store the image folder
         self.parent_folder = os.path.dirname(self.image_folder)  # Get one level above image folder
+        self.label_stem = os.path.splitext(os.path.basename(file_path))[0]
+
+        # Nothing can be drawn or exported until the new image is shown, the boxes
+        # of the previous image must never be saved under the new image's name
+        self.current_image = None
+        self.rectangles.clear()
+        self.update_annotation_info()
+        self.export_button.setDisabled(True)
+
+        # Decode off the UI thread, a request for an image the user already clicked past is dropped
+        token = self.selection_token
+        scheduler = get_scheduler()
+        scheduler.cancel_group('foreground')
+        future = scheduler.submit(QImage, file_path, priority=FOREGROUND, group='foreground')
+        future.add_done_callback(lambda f: self.image_decoded.emit(token, f))
+
+        self.filmstrip.set_folder(self.image_folder, self.parent_folder)
+        self.filmstrip.select_image(file_path)
+
+    def on_image_decoded(self, token, future):
+        # Ignore images the user is no longer looking at, including folders and JSON files selected since
+        if future.cancelled() or token != self.selection_token:
+            return
+        self.show_image(QPixmap.fromImage(future.result()))
+        self.export_button.setDisabled("annotated_images" in self.image_path)
+
+    def open_video(self, file_path):
+        """Open a video so its frames can be labeled without dumping them to disk"""
+        try:
+            self.video = VideoFrameSource(file_path)
+        except IOError as e:
+            self.image_display.setText(str(e))
+            return
+
+        self.image_path = file_path
+        self.image_folder = os.path.dirname(file_path)
+        self.parent_folder = os.path.dirname(self.image_folder)
+        self.export_button.setDisabled(False)
+
+        self.frame_slider.blockSignals(True)
+        self.frame_slider.setRange(0, max(0, self.video.frame_count - 1))
+        self.frame_slider.setValue(0)
+        self.frame_slider.blockSignals(False)
+        self.frame_widget.show()
+        self.display_frame(0)
+
+        # The range above is the container's estimate until the seek index has been built.
+        # Future callbacks run in registration order, so the source already holds the new index
+        if self.video.index_future is not None:
+            self.video.index_future.add_done_callback(lambda f: self.video_index_built.emit(file_path))
+
+    def on_video_index_built(self, video_path):
+        """Update the frame range once the exact frame count of the open video is known"""
+        if self.video is None or self.video.video_path != video_path:
+            return
+
+        last_frame = max(0, self.video.frame_count - 1)
+        self.frame_slider.blockSignals(True)
+        self.frame_slider.setRange(0, last_frame)
+        self.frame_slider.blockSignals(False)
+        if self.frame_id is not None and self.frame_id > last_frame:
+            self.display_frame(last_frame)
+        elif self.frame_id is not None:
+            self.frame_label.setText(f"Frame {self.frame_id + 1}/{self.video.frame_count}")
+
+    def close_video(self):
+        if self.video is not None:
+            self.video.release()
+            self.video = None
+            self.frame_id = None
+        self.frame_widget.hide()
+
+    def step_frame(self, step):
+        if self.video is not None:
+            self.frame_slider.setValue(self.frame_slider.value() + step)
+
+    def display_frame(self, frame_id):
+        """Decode and show a single frame of the open video"""
+        if self.video is None:
+            return
+
+        frame = self.video.read_frame(frame_id)
+        if frame is None:
+            self.image_display.setText(f"Failed to decode frame {frame_id}.")
+            return
+
+        self.frame_id = frame_id
+        self.label_stem = frame_stem(self.video.video_path, frame_id)
+        self.frame_label.setText(f"Frame {frame_id + 1}/{self.video.frame_count}")
+
+        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        height, width = rgb.shape[:2]
+        image = QImage(rgb.data, width, height, 3 * width, QImage.Format_RGB888).copy()
+        self.show_image(QPixmap.fromImage(image))
+
+    def show_image(self, pixmap):
+        """Show an image (file or video frame) together with its saved labels"""
+        self.current_image = pixmap
 
-        if "annotated_images" in file_path:
-            self.export_button.setDisabled(True)
-        
         if self.current_image.isNull():
             self.image_display.setText("Failed to load image.")
         else:
@@ -425,12 +604,14 @@ class FileExplorer(QWidget):
             self.image_size = self.current_image.size()
             self.image_display.setPixmap(self.scaled_image)
             self.rectangles.clear()
+
+            # Reload the saved boxes so they can be edited instead of redrawn
+            if "annotated_images" not in self.image_path:
+                self.load_saved_boxes()
             
             # # Set json
             label_folder = os.path.join(self.parent_folder, "labels")
-            files_and_dirs = os.listdir(label_folder)
-            
-            filename = os.path.splitext(os.path.basename(file_path))[0] + ".json"
+            filename = self.label_stem + ".json"
             
             try:
                 json_path = os.path.join(label_folder, filename)
@@ -438,37 +619,76 @@ class FileExplorer(QWidget):
             except:
                 print("No File found")
 
+    def load_saved_boxes(self):
+        """Load the saved labels of the displayed image or frame into editable boxes"""
+        labels_folder = os.path.join(self.parent_folder, "labels")
+        # YOLO coordinates are denormalized with the size stored when the image was shown
+        size = (self.image_size.width(), self.image_size.height())
+        try:
+            boxes = self.label_cache.get(labels_folder, self.label_stem, lambda: size)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Could not load labels of {self.label_stem}: {str(e)}")
+            return
+
+        self.rectangles = [{
+            'rect': QRect(box['x'], box['y'], box['width'], box['height']),
+            'label': box['label']
+        } for box in boxes]
+        if self.rectangles:
+            self.update_image_display()
+        self.update_annotation_info()
+
+    def edit_box_at(self, point, global_pos):
+        """Relabel or delete the topmost box under a point"""
+        for item in reversed(self.rectangles):
+            if item['rect'].contains(point):
+                break
+        else:
+            return
+
+        menu = QMenu(self)
+        relabel_action = menu.addAction("Relabel")
+        delete_action = menu.addAction("Delete")
+        chosen = menu.exec_(global_pos)
+
+        if chosen == relabel_action:
+            label, ok = QInputDialog.getText(self, "Object Label", "Enter a label for this object:", text=item['label'])
+            if ok:
+                item['label'] = label
+        elif chosen == delete_action:
+            self.rectangles.remove(item)
+        self.update_image_display()
+
     def display_json(self, json_path):
         """Display the content of a JSON file"""
         try:
             print(json_path)
-            with open(json_path, 'r') as json_file:
-                data = json.load(json_file)
+            # Only the visible rows are read, the file is indexed in the background
+            self.json_display.open_file(json_path)
             
-            # Convert the data to a formatted string for display
-            formatted_json = json.dumps(data, indent=4)
-            
-            # Display the formatted JSON string in the QLabel
-            self.json_display.setText(f"JSON Content:\n{formatted_json}")
-            
-            # Set styling for the QLabel (left alignment and monospaced font)
+            # Set styling for the viewer (monospaced font)
             self.json_display.setStyleSheet("""
                 font-family: Courier, monospace;
                 font-size: 10pt;
                 background-color: #f7f7f7;
                 border: 1px solid #cccccc;
                 padding: 10px;
-                text-align: left;
-                word-wrap: break-word;
             """)
         except Exception as e:
             # QMessageBox.warning(self, "Error", f"Failed to read JSON file: {str(e)}")   
-            self.json_display.setText(f"No Json File Found")
+            self.json_display.show_message(f"No Json File Found")
             
     def mousePressEvent(self, event):
         if "annotated_images" in self.current_file_path:
             return
 
+        # Right click on a box to relabel or delete it
+        if self.current_image and event.button() == Qt.RightButton:
+            local_pos = event.pos() - self.image_display.pos()
+            if self.is_inside_image(local_pos):
+                self.edit_box_at(self.convert_to_original_image_coords(local_pos), event.globalPos())
+            return
+
         if self.current_image and event.button() == Qt.LeftButton:
             self.drawing = True
             local_pos = (event.pos() - self.image_display.pos())
@@ -574,10 +794,35 @@ class FileExplorer(QWidget):
             self.rectangles.pop()
             self.update_image_display()
 
+    def update_scheduler_metrics(self):
+        """Show the queue depth and utilization of the background workers"""
+        metrics = get_scheduler().metrics()
+        threads = metrics['threads']
+        processes = metrics['processes']
+        queued = sum(threads['queued'].values()) + sum(processes['queued'].values())
+        self.metrics_label.setText(f"Queued: {queued} | Threads: {threads['utilization']:.0%} | "
+                                   f"Processes: {processes['utilization']:.0%}")
+        self.metrics_label.setToolTip("\n".join(f"{name}: {count}" for name, count in threads['queued'].items()))
+
+    def release_resources(self):
+        """Stop the background work before the window goes away"""
+        # The metrics timer would otherwise start a new scheduler on its next tick
+        self.metrics_timer.stop()
+        self.close_video()
+        self.filmstrip.close()
+        shutdown_scheduler()
+
+    def closeEvent(self, event):
+        self.release_resources()
+        event.accept()
+
     def quit_program(self):
+        self.release_resources()
         QApplication.quit()
 
-app = QApplication(sys.argv)
-window = FileExplorer()
-window.show()
-sys.exit(app.exec_())
+# Guarded so spawned worker processes can import this module without starting the GUI
+if __name__ == "__main__":
+    app = QApplication(sys.argv)
+    window = FileExplorer()
+    window.show()
+    sys.exit(app.exec_())
@@ -0,0 +1,60 @@
+import os
+import json
+import threading
+from PIL import Image
+
+# Name of the size cache file, stored in the root of a dataset folder
+CACHE_FILENAME = '.image_sizes.json'
+
+def read_image_size(image_path):
+    """Read (width, height) from the image header without decoding the pixel data"""
+    # PIL only parses the header on open, pixels are decoded lazily on first access
+    with Image.open(image_path) as img:
+        return img.size
+
+class ImageSizeCache:
+    """Persistent cache of image sizes keyed by path and modification time"""
+    def __init__(self, cache_path):
+        self.cache_path = cache_path
+        self.entries = {}  # abs path -> [mtime_ns, width, height]
+        self.dirty = False
+        self.lock = threading.Lock()
+
+        if os.path.exists(cache_path):
+            try:
+                with open(cache_path, 'r') as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                # A broken cache is simply rebuilt
+                self.entries = {}
+
+    def get(self, image_path):
+        """Return (width, height) of the image, probing the header only when the file changed"""
+        key = os.path.abspath(image_path)
+        mtime = os.stat(key).st_mtime_ns
+
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry and entry[0] == mtime:
+            return entry[1], entry[2]
+
+        width, height = read_image_size(key)
+        with self.lock:
+            self.entries[key] = [mtime, width, height]
+            self.dirty = True
+        return width, height
+
+    def save(self):
+        """Write the cache back to disk if anything changed"""
+        with self.lock:
+            if not self.dirty:
+                return
+            tmp_path = self.cache_path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(self.entries, f)
+            os.replace(tmp_path, self.cache_path)
+            self.dirty = False
+
+def dataset_size_cache(dataset_folder):
+    """Open the size cache that belongs to a dataset folder (e.g. Datasets/Stag)"""
+    return ImageSizeCache(os.path.join(dataset_folder, CACHE_FILENAME))
@@ -0,0 +1,137 @@
+import os
+import json
+from collections import OrderedDict
+import numpy as np
+
+# Combined label file written by the old labeling tool, not a per-image label
+LEGACY_REGIONS_FILE = 'labeled_regions.json'
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff')
+
+def read_yolo_txt(txt_path):
+    """Read a YOLO label file into a list of (class_id, x_center, y_center, width, height)"""
+    boxes = []
+    with open(txt_path, 'r') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) != 5:
+                continue
+            boxes.append((int(float(parts[0])),) + tuple(float(v) for v in parts[1:]))
+    return boxes
+
+def read_boxes_array(txt_path):
+    """Read a YOLO label file into a float32 [n, 5] array"""
+    return np.asarray(read_yolo_txt(txt_path), dtype=np.float32).reshape(-1, 5)
+
+def read_label_json(json_path):
+    """Read a per-image label JSON file as written by the GUI"""
+    with open(json_path, 'r') as f:
+        return json.load(f)
+
+def yolo_to_pixel(x_center, y_center, width, height, img_width, img_height):
+    """Convert a normalized YOLO box to pixel (x, y, width, height)"""
+    box_width = width * img_width
+    box_height = height * img_height
+    x = x_center * img_width - box_width / 2
+    y = y_center * img_height - box_height / 2
+    return int(round(x)), int(round(y)), int(round(box_width)), int(round(box_height))
+
+def iter_label_stems(labels_folder):
+    """Yield the sorted stems of all per-image label files (.json or .txt) in a folder"""
+    stems = set()
+    with os.scandir(labels_folder) as entries:
+        for entry in entries:
+            if not entry.is_file() or entry.name == LEGACY_REGIONS_FILE:
+                continue
+            stem, ext = os.path.splitext(entry.name)
+            if ext in ('.json', '.txt') and not stem.startswith('.'):
+                stems.add(stem)
+    yield from sorted(stems)
+
+def index_images(images_folder):
+    """Map image stems to their file paths for a folder of images"""
+    images = {}
+    with os.scandir(images_folder) as entries:
+        for entry in entries:
+            stem, ext = os.path.splitext(entry.name)
+            if entry.is_file() and ext.lower() in IMAGE_EXTENSIONS:
+                images[stem] = entry.path
+    return images
+
+def read_label_boxes(labels_folder, stem):
+    """Read the boxes of one image without converting them
+
+    Returns (pixel boxes, None) when the GUI JSON file has annotations, since it keeps
+    the label names, otherwise (None, normalized YOLO rows) from the txt file.
+    """
+    json_path = os.path.join(labels_folder, f"{stem}.json")
+    if os.path.exists(json_path):
+        data = read_label_json(json_path)
+        if isinstance(data, dict) and 'annotations' in data:
+            return [{
+                'label': str(box['label']),
+                'x': box['x'],
+                'y': box['y'],
+                'width': box['width'],
+                'height': box['height']
+            } for box in data['annotations']], None
+
+    txt_path = os.path.join(labels_folder, f"{stem}.txt")
+    if not os.path.exists(txt_path):
+        return [], None
+    return None, read_yolo_txt(txt_path)
+
+def to_pixel_boxes(pixel_boxes, yolo_rows, image_size):
+    """Turn the result of read_label_boxes into pixel boxes, image_size is only called for YOLO rows"""
+    if pixel_boxes is not None:
+        return pixel_boxes
+
+    img_width, img_height = image_size()
+    boxes = []
+    for class_id, x_center, y_center, width, height in yolo_rows:
+        x, y, box_width, box_height = yolo_to_pixel(x_center, y_center, width, height, img_width, img_height)
+        boxes.append({'label': str(class_id), 'x': x, 'y': y, 'width': box_width, 'height': box_height})
+    return boxes
+
+def load_pixel_boxes(labels_folder, stem, image_size):
+    """Load the boxes of one image as dicts with label, x, y, width and height in pixels
+
+    The GUI JSON file is preferred since it keeps the label names, the YOLO txt
+    file is used otherwise. image_size is a callable returning (width, height),
+    it is only called when normalized YOLO coordinates have to be converted.
+    """
+    return to_pixel_boxes(*read_label_boxes(labels_folder, stem), image_size)
+
+class LabelCache:
+    """LRU cache of parsed label sets, an entry is reused until its JSON or txt file changes
+
+    YOLO rows are cached normalized and converted on every get, so the same labels
+    shown at another image size are never served with stale pixel coordinates.
+    """
+    def __init__(self, capacity=256):
+        self.capacity = capacity
+        self.entries = OrderedDict()  # (labels folder, stem) -> (mtimes, pixel boxes, yolo rows)
+
+    def _mtimes(self, labels_folder, stem):
+        mtimes = []
+        for ext in ('.json', '.txt'):
+            try:
+                mtimes.append(os.stat(os.path.join(labels_folder, stem + ext)).st_mtime_ns)
+            except OSError:
+                mtimes.append(None)
+        return tuple(mtimes)
+
+    def get(self, labels_folder, stem, image_size):
+        """Return the boxes of an image like load_pixel_boxes, parsing the files only when they changed"""
+        key = (labels_folder, stem)
+        mtimes = self._mtimes(labels_folder, stem)
+        entry = self.entries.get(key)
+        if entry and entry[0] == mtimes:
+            self.entries.move_to_end(key)
+            return to_pixel_boxes(entry[1], entry[2], image_size)
+
+        pixel_boxes, yolo_rows = read_label_boxes(labels_folder, stem) if mtimes != (None, None) else ([], None)
+        self.entries[key] = (mtimes, pixel_boxes, yolo_rows)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+        return to_pixel_boxes(pixel_boxes, yolo_rows, image_size)
@@ -0,0 +1,173 @@
+import os
+import json
+import shutil
+import argparse
+import numpy as np
+
+from LabelIO import read_boxes_array
+
+# Files that make up one shard folder
+BOXES_FILE = 'boxes.npy'      # float32 [N, 5] rows of class_id, x_center, y_center, width, height
+OFFSETS_FILE = 'offsets.npy'  # int64 [M + 1], boxes of image i are boxes[offsets[i]:offsets[i + 1]]
+INDEX_FILE = 'index.json'     # image stems and label file mtimes, in row order, plus the totals
+
+# A shard is built next to the live one and swapped in as a whole folder
+BUILDING_SUFFIX = '.building'
+PREVIOUS_SUFFIX = '.previous'
+
+class LabelShard:
+    """Read-only view of a packed label shard, box lookups are O(1) slices of a memory map"""
+    def __init__(self, shard_folder):
+        self.shard_folder = shard_folder
+        self.boxes = np.load(os.path.join(shard_folder, BOXES_FILE), mmap_mode='r')
+        self.offsets = np.load(os.path.join(shard_folder, OFFSETS_FILE), mmap_mode='r')
+
+        with open(os.path.join(shard_folder, INDEX_FILE), 'r') as f:
+            index = json.load(f)
+        self.stems = index['stems']
+        self.mtimes = index['mtimes']
+
+        # Never serve boxes from files that do not belong together
+        if (len(self.offsets) != len(self.stems) + 1 or len(self.mtimes) != len(self.stems)
+                or index.get('images') != len(self.stems) or index.get('boxes') != len(self.boxes)
+                or int(self.offsets[-1]) != len(self.boxes)):
+            raise ValueError(f"Label shard in {shard_folder} is inconsistent")
+        self.rows = {stem: row for row, stem in enumerate(self.stems)}
+
+    def __len__(self):
+        return len(self.stems)
+
+    def __getitem__(self, row):
+        """Return the boxes of the image at a row, as a view into the memory map (no copy)"""
+        return self.boxes[self.offsets[row]:self.offsets[row + 1]]
+
+    def get(self, stem):
+        """Return the boxes of an image by stem, or None when it is not in the shard"""
+        row = self.rows.get(stem)
+        return None if row is None else self[row]
+
+def scan_label_files(labels_folder):
+    """Return sorted (stem, mtime_ns) pairs of the YOLO txt files in a folder"""
+    entries = []
+    with os.scandir(labels_folder) as files:
+        for entry in files:
+            stem, ext = os.path.splitext(entry.name)
+            if ext == '.txt' and entry.is_file():
+                entries.append((stem, entry.stat().st_mtime_ns))
+    entries.sort()
+    return entries
+
+def build_shard(labels_folder, shard_folder):
+    """Pack all YOLO txt files of a folder into a shard, only re-reading changed label files
+
+    The new shard is written to a separate folder and swapped in as a whole, so readers
+    and later incremental builds never see files of two different builds mixed together.
+    """
+    building_folder = shard_folder + BUILDING_SUFFIX
+    previous_folder = shard_folder + PREVIOUS_SUFFIX
+    # A crash during the last swap can leave the previous shard under its temporary name
+    if not os.path.exists(shard_folder) and os.path.exists(previous_folder):
+        os.replace(previous_folder, shard_folder)
+    if os.path.exists(building_folder):
+        shutil.rmtree(building_folder)
+    os.makedirs(building_folder)
+    entries = scan_label_files(labels_folder)
+
+    old = None
+    if os.path.exists(os.path.join(shard_folder, INDEX_FILE)):
+        try:
+            old = LabelShard(shard_folder)
+        except (OSError, ValueError, KeyError):
+            print(f"Existing shard in {shard_folder} is unreadable, rebuilding")
+
+    # Work out the box count of every image, parsing only new or modified files
+    counts = np.zeros(len(entries), dtype=np.int64)
+    sources = []  # per row: ('old', old_row) or ('new', array)
+    changed = 0
+    for row, (stem, mtime) in enumerate(entries):
+        old_row = old.rows.get(stem) if old else None
+        if old_row is not None and old.mtimes[old_row] == mtime:
+            counts[row] = old.offsets[old_row + 1] - old.offsets[old_row]
+            sources.append(('old', old_row))
+        else:
+            boxes = read_boxes_array(os.path.join(labels_folder, f"{stem}.txt"))
+            counts[row] = len(boxes)
+            sources.append(('new', boxes))
+            changed += 1
+
+    if old is not None and changed == 0 and len(entries) == len(old):
+        print(f"Shard {shard_folder} is up to date ({len(entries)} images)")
+        shutil.rmtree(building_folder)
+        return len(entries), 0
+
+    offsets = np.zeros(len(entries) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    total = int(offsets[-1])
+
+    boxes_path = os.path.join(building_folder, BOXES_FILE)
+    if total == 0:
+        np.save(boxes_path, np.zeros((0, 5), dtype=np.float32))
+    else:
+        packed = np.lib.format.open_memmap(boxes_path, mode='w+', dtype=np.float32, shape=(total, 5))
+        row = 0
+        while row < len(sources):
+            kind, source = sources[row]
+            if kind == 'new':
+                packed[offsets[row]:offsets[row + 1]] = source
+                row += 1
+                continue
+            # Copy runs of unchanged images that are also contiguous in the old shard in one go
+            end = row + 1
+            while end < len(sources) and sources[end][0] == 'old' and sources[end][1] == source + (end - row):
+                end += 1
+            old_start = old.offsets[source]
+            old_end = old.offsets[source + (end - row)]
+            packed[offsets[row]:offsets[end]] = old.boxes[old_start:old_end]
+            row = end
+        packed.flush()
+        del packed
+
+    np.save(os.path.join(building_folder, OFFSETS_FILE), offsets)
+    with open(os.path.join(building_folder, INDEX_FILE), 'w') as f:
+        json.dump({
+            'labels_folder': os.path.abspath(labels_folder),
+            'images': len(entries),
+            'boxes': total,
+            'stems': [stem for stem, _ in entries],
+            'mtimes': [mtime for _, mtime in entries]
+        }, f)
+
+    # Swap the folders, readers that still map the old files keep working since they are only unlinked
+    old = None
+    if os.path.exists(previous_folder):
+        shutil.rmtree(previous_folder)
+    if os.path.exists(shard_folder):
+        os.replace(shard_folder, previous_folder)
+    os.replace(building_folder, shard_folder)
+    shutil.rmtree(previous_folder, ignore_errors=True)
+
+    print(f"Shard {shard_folder}: {len(entries)} images, {total} boxes, {changed} label files re-read")
+    return len(entries), changed
+
+def build_dataset_shards(dataset_folder, splits=None):
+    """Build one shard per split (labels/train, labels/val, ...) into <dataset>/shards"""
+    labels_folder = os.path.join(dataset_folder, "labels")
+    if splits is None:
+        splits = sorted(name for name in os.listdir(labels_folder)
+                        if os.path.isdir(os.path.join(labels_folder, name)))
+
+    # Datasets that have not been split yet are packed as a single shard
+    if not splits:
+        build_shard(labels_folder, os.path.join(dataset_folder, "shards", "all"))
+        return
+
+    for split in splits:
+        build_shard(os.path.join(labels_folder, split), os.path.join(dataset_folder, "shards", split))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pack the YOLO labels of a dataset into memory-mapped shards")
+    parser.add_argument('dataset', nargs='?', default='Datasets/Stag', help="Dataset folder containing labels/")
+    parser.add_argument('--splits', nargs='*', help="Splits to pack, defaults to every folder in labels/")
+    args = parser.parse_args()
+
+    build_dataset_shards(args.dataset, args.splits)
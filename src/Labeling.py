@@ -1,7 +1,8 @@
 import sys
 import os
-from PyQt5.QtCore import Qt, QFile, QTextStream, QFileInfo
-from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout, QHBoxLayout, QTreeView, QFileSystemModel, QLabel, QTextEdit, QMessageBox
+from PyQt5.QtCore import Qt, QFileInfo
+from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout, QHBoxLayout, QTreeView, QFileSystemModel, QLabel, QMessageBox
+from TextViewer import LargeFileView
 
 class FileExplorer(QWidget):
     def __init__(self):
@@ -29,9 +30,8 @@ class FileExplorer(QWidget):
         # Connect the selectionChanged signal to handle file clicks
         self.tree.selectionModel().selectionChanged.connect(self.on_file_selected)
 
-        # Create a QTextEdit for displaying file content (on the right side)
-        self.file_content_display = QTextEdit(self)
-        self.file_content_display.setReadOnly(True)  # Make the QTextEdit read-only
+        # Create a read-only viewer for displaying file content (on the right side)
+        self.file_content_display = LargeFileView(self)
 
         # Create a horizontal layout
         h_layout = QHBoxLayout()
@@ -53,7 +53,7 @@ class FileExplorer(QWidget):
 
         # Check if the selected item is a directory
         if QFileInfo(file_path).isDir():
-            self.file_content_display.clear()  # Clear the content display if it's a directory
+            self.file_content_display.close_file()  # Clear the content display if it's a directory
             return
 
         # Check if the selected item is a file (using QFileInfo)
@@ -61,14 +61,11 @@ class FileExplorer(QWidget):
             self.display_file_content(file_path)
 
     def display_file_content(self, file_path):
-        # Open the file and read its contents (only for text files)
-        file = QFile(file_path)
-        if file.open(QFile.ReadOnly | QFile.Text):
-            text_stream = QTextStream(file)
-            file_content = text_stream.readAll()  # Read the entire file content
-            self.file_content_display.setText(file_content)  # Display it in QTextEdit
-        else:
-            self.file_content_display.setText("Failed to open file.")
+        # Memory-map the file, only the visible rows are read (only for text files)
+        try:
+            self.file_content_display.open_file(file_path)
+        except OSError:
+            self.file_content_display.show_message("Failed to open file.")
 
 # Run the application
 app = QApplication(sys.argv)
@@ -0,0 +1,191 @@
+import os
+import time
+import heapq
+import itertools
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+
+# Priority classes, lower values run first
+FOREGROUND = 0  # The image the user is looking at
+PREFETCH = 1    # Frames and images the user is likely to look at next
+THUMBNAIL = 2   # Filmstrip thumbnails
+BATCH = 3       # Exports, index builds and other long jobs
+
+PRIORITY_NAMES = {FOREGROUND: 'foreground', PREFETCH: 'prefetch', THUMBNAIL: 'thumbnail', BATCH: 'batch'}
+
+class _Pool:
+    """Priority queue plus the bookkeeping of one kind of worker (threads or processes)"""
+    def __init__(self, name, workers):
+        self.name = name
+        self.workers = workers
+        self.heap = []  # (priority, order, future, fn, args, kwargs)
+        self.running = 0
+        self.busy_time = 0.0  # Seconds spent in finished tasks
+        self.started = {}  # worker id -> start time of the task it is running
+        self.completed = 0
+        self.last_sample = (time.monotonic(), 0.0)
+
+    def busy_until(self, now):
+        return self.busy_time + sum(now - start for start in self.started.values())
+
+class TaskScheduler:
+    """Shared thread pool and spawn-safe process pool that run tasks by priority class
+
+    Every submit returns a concurrent.futures.Future. Tasks that are still queued can be
+    cancelled through the future or all at once by group, e.g. when the user clicks past
+    an image. Process tasks must be picklable top-level functions, since workers are spawned.
+    """
+    def __init__(self, threads=None, processes=None):
+        cpus = os.cpu_count() or 2
+        self.condition = threading.Condition()
+        self.counter = itertools.count()
+        self.groups = {}  # group -> set of queued futures
+        self.cancelled = 0
+        self.shutting_down = False
+
+        self.thread_pool = _Pool('threads', threads or max(2, cpus - 1))
+        self.process_pool = _Pool('processes', processes or max(1, cpus // 2))
+        self.executor = None  # Created when the first process task arrives
+
+        for i in range(self.thread_pool.workers):
+            threading.Thread(target=self._worker, args=(self.thread_pool,), name=f"scheduler-thread-{i}",
+                             daemon=True).start()
+        # Process tasks are fed to the executor by one dispatcher per process, so the
+        # executor never holds a backlog and priorities are respected
+        for i in range(self.process_pool.workers):
+            threading.Thread(target=self._worker, args=(self.process_pool,), name=f"scheduler-dispatch-{i}",
+                             daemon=True).start()
+
+    def submit(self, fn, *args, priority=BATCH, group=None, newest_first=False, **kwargs):
+        """Run fn(*args, **kwargs) on the thread pool"""
+        return self._enqueue(self.thread_pool, fn, args, kwargs, priority, group, newest_first)
+
+    def submit_process(self, fn, *args, priority=BATCH, group=None, newest_first=False, **kwargs):
+        """Run fn(*args, **kwargs) in a spawned worker process"""
+        return self._enqueue(self.process_pool, fn, args, kwargs, priority, group, newest_first)
+
+    def _enqueue(self, pool, fn, args, kwargs, priority, group, newest_first):
+        future = Future()
+        # Within a priority class tasks run in submit order, or newest first when asked
+        # (e.g. thumbnails, where the latest request belongs to the visible items)
+        order = next(self.counter)
+        if newest_first:
+            order = -order
+
+        with self.condition:
+            if self.shutting_down:
+                raise RuntimeError("Scheduler is shut down")
+            heapq.heappush(pool.heap, (priority, order, future, fn, args, kwargs))
+            if group is not None:
+                self.groups.setdefault(group, set()).add(future)
+                future.add_done_callback(lambda f: self._forget(group, f))
+            self.condition.notify_all()
+        return future
+
+    def _forget(self, group, future):
+        with self.condition:
+            futures = self.groups.get(group)
+            if futures is not None:
+                futures.discard(future)
+                if not futures:
+                    del self.groups[group]
+
+    def cancel_group(self, group):
+        """Cancel every queued task of a group, running tasks are left to finish"""
+        with self.condition:
+            futures = list(self.groups.get(group, ()))
+        cancelled = sum(1 for future in futures if future.cancel())
+        with self.condition:
+            self.cancelled += cancelled
+        return cancelled
+
+    def _worker(self, pool):
+        worker_id = threading.get_ident()
+        while True:
+            with self.condition:
+                while not pool.heap and not self.shutting_down:
+                    self.condition.wait()
+                if not pool.heap:
+                    return
+                _, _, future, fn, args, kwargs = heapq.heappop(pool.heap)
+                if not future.set_running_or_notify_cancel():
+                    continue
+                pool.running += 1
+                pool.started[worker_id] = time.monotonic()
+
+            try:
+                if pool is self.thread_pool:
+                    result = fn(*args, **kwargs)
+                else:
+                    result = self._executor().submit(fn, *args, **kwargs).result()
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+            finally:
+                with self.condition:
+                    pool.running -= 1
+                    pool.completed += 1
+                    pool.busy_time += time.monotonic() - pool.started.pop(worker_id)
+
+    def _executor(self):
+        with self.condition:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(max_workers=self.process_pool.workers,
+                                                    mp_context=multiprocessing.get_context("spawn"))
+            return self.executor
+
+    def metrics(self):
+        """Queue depth per priority class and utilization of both pools since the previous call"""
+        now = time.monotonic()
+        metrics = {'cancelled': self.cancelled}
+        with self.condition:
+            for pool in (self.thread_pool, self.process_pool):
+                queued = {name: 0 for name in PRIORITY_NAMES.values()}
+                for priority, _, future, _, _, _ in pool.heap:
+                    if not future.cancelled():
+                        queued[PRIORITY_NAMES[priority]] += 1
+
+                busy = pool.busy_until(now)
+                last_time, last_busy = pool.last_sample
+                elapsed = (now - last_time) * pool.workers
+                pool.last_sample = (now, busy)
+
+                metrics[pool.name] = {
+                    'workers': pool.workers,
+                    'queued': queued,
+                    'running': pool.running,
+                    'completed': pool.completed,
+                    'utilization': min(1.0, (busy - last_busy) / elapsed) if elapsed > 0 else 0.0
+                }
+        return metrics
+
+    def shutdown(self):
+        """Drop all queued tasks and stop the workers"""
+        with self.condition:
+            self.shutting_down = True
+            pending = [entry[2] for pool in (self.thread_pool, self.process_pool) for entry in pool.heap]
+            self.condition.notify_all()
+        for future in pending:
+            future.cancel()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler():
+    """Return the scheduler shared by all GUI workers"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = TaskScheduler()
+        return _scheduler
+
+def shutdown_scheduler():
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is not None:
+            _scheduler.shutdown()
+            _scheduler = None
@@ -0,0 +1,172 @@
+import os
+import mmap
+import threading
+from array import array
+from collections import OrderedDict
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex, pyqtSignal
+from PyQt5.QtGui import QFontDatabase
+from PyQt5.QtWidgets import QListView
+
+from TaskScheduler import get_scheduler, FOREGROUND
+
+MAX_ROW_BYTES = 4096  # Long lines (e.g. minified JSON) are split into rows of at most this size
+PAGE_ROWS = 64  # Only the byte offset of every PAGE_ROWS-th row is kept in the index
+PAGE_CACHE_SIZE = 32  # Decoded pages kept for scrolling back and forth
+PUBLISH_ROWS = 50000  # Rows indexed before the view is told about them
+
+def row_end(mm, pos, size):
+    """Return the end offset of the display row starting at pos"""
+    limit = min(pos + MAX_ROW_BYTES, size)
+    newline = mm.find(b'\n', pos, limit)
+    if newline != -1:
+        return newline + 1
+    end = limit
+    if end < size:
+        # Never split a multi-byte UTF-8 character over two rows
+        while end > pos + 1 and (mm[end] & 0xC0) == 0x80:
+            end -= 1
+    return end
+
+class LineIndexModel(QAbstractListModel):
+    """Rows of a memory-mapped text file, indexed in the background and decoded page by page"""
+    rows_indexed = pyqtSignal(int, int)  # generation, total rows indexed so far
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.mm = None
+        self.file = None
+        self.size = 0
+        self.row_count = 0
+        self.checkpoints = array('q')  # Byte offset of rows 0, PAGE_ROWS, 2 * PAGE_ROWS, ...
+        self.pages = OrderedDict()  # page -> list of decoded rows
+        self.message = None  # Single row shown instead of a file
+        self.generation = 0
+        self.group = ('text_index', id(self))
+        self.lock = threading.Lock()
+        self.rows_indexed.connect(self._on_rows_indexed)
+
+    def open(self, file_path):
+        """Map a file and start indexing it, returns immediately whatever the file size"""
+        file = open(file_path, 'rb')
+        size = os.fstat(file.fileno()).st_size
+        mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+
+        self.beginResetModel()
+        self._release()
+        self.file = file
+        self.mm = mm
+        self.size = size
+        self.message = None
+        self.endResetModel()
+
+        if mm is not None:
+            # The file being looked at is indexed ahead of prefetch and thumbnail work
+            get_scheduler().submit(self._index, mm, size, self.checkpoints, self.generation,
+                                   priority=FOREGROUND, group=self.group)
+
+    def show_message(self, message):
+        self.beginResetModel()
+        self._release()
+        self.message = message
+        self.endResetModel()
+
+    def close(self):
+        self.show_message(None)
+
+    def _release(self):
+        # Stops a running indexer and drops everything that refers to the old mapping
+        get_scheduler().cancel_group(self.group)
+        with self.lock:
+            self.generation += 1
+            if self.mm is not None:
+                self.mm.close()
+            if self.file is not None:
+                self.file.close()
+            self.mm = None
+            self.file = None
+            self.size = 0
+            self.row_count = 0
+            self.checkpoints = array('q')
+            self.pages.clear()
+
+    def _index(self, mm, size, checkpoints, generation):
+        pos = 0
+        rows = 0
+        while pos < size:
+            with self.lock:
+                # The file was closed or replaced, the mapping may no longer be valid
+                if generation != self.generation:
+                    return
+                for _ in range(PUBLISH_ROWS):
+                    if pos >= size:
+                        break
+                    if rows % PAGE_ROWS == 0:
+                        checkpoints.append(pos)
+                    pos = row_end(mm, pos, size)
+                    rows += 1
+            self.rows_indexed.emit(generation, rows)
+
+    def _on_rows_indexed(self, generation, rows):
+        if generation != self.generation or rows <= self.row_count:
+            return
+        self.beginInsertRows(QModelIndex(), self.row_count, rows - 1)
+        self.row_count = rows
+        self.endInsertRows()
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return 1 if self.message else self.row_count
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role != Qt.DisplayRole:
+            return None
+        if self.message:
+            return self.message
+        page, offset = divmod(index.row(), PAGE_ROWS)
+        rows = self._page(page)
+        return rows[offset] if offset < len(rows) else None
+
+    def _page(self, page):
+        rows = self.pages.get(page)
+        if rows is not None:
+            self.pages.move_to_end(page)
+            return rows
+
+        rows = []
+        with self.lock:
+            if self.mm is None or page >= len(self.checkpoints):
+                return rows
+            pos = self.checkpoints[page]
+            while len(rows) < PAGE_ROWS and pos < self.size:
+                end = row_end(self.mm, pos, self.size)
+                rows.append(self.mm[pos:end].decode('utf-8', 'replace').rstrip('\r\n'))
+                pos = end
+
+        self.pages[page] = rows
+        while len(self.pages) > PAGE_CACHE_SIZE:
+            self.pages.popitem(last=False)
+        return rows
+
+class LargeFileView(QListView):
+    """Read-only viewer for text and JSON files of any size, only the visible rows are decoded"""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.file_model = LineIndexModel(self)
+        self.setModel(self.file_model)
+        # Uniform row heights let the view scroll through millions of rows without measuring them
+        self.setUniformItemSizes(True)
+        self.setFont(QFontDatabase.systemFont(QFontDatabase.FixedFont))
+        self.setSelectionMode(QListView.ExtendedSelection)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarAsNeeded)
+
+    def open_file(self, file_path):
+        self.file_model.open(file_path)
+        self.scrollToTop()
+
+    def show_message(self, message):
+        self.file_model.show_message(message)
+
+    def close_file(self):
+        """Unmap the current file, needed before the file is rewritten"""
+        self.file_model.close()
@@ -0,0 +1,303 @@
+import os
+import json
+import mmap
+import struct
+import threading
+from collections import OrderedDict
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex, QSize, pyqtSignal
+from PyQt5.QtGui import QImage, QImageReader, QPixmap, QColor
+from PyQt5.QtWidgets import QListView
+
+from LabelIO import IMAGE_EXTENSIONS
+from TaskScheduler import get_scheduler, THUMBNAIL
+
+THUMB_SIZE = 96
+# Every slot holds a (width, height) header followed by RGB888 pixels of at most THUMB_SIZE x THUMB_SIZE
+SLOT_HEADER = struct.Struct('<HH')
+SLOT_BYTES = SLOT_HEADER.size + THUMB_SIZE * THUMB_SIZE * 3
+INITIAL_SLOTS = 64  # Slots of a new cache file, it doubles from there
+GROW_SLOTS = 1024  # The cache file never grows by more than this many slots at a time
+
+# Cache files, stored in the root of a dataset folder
+CACHE_FILENAME = '.thumbnails.bin'
+INDEX_FILENAME = '.thumbnails.json'
+
+def generate_thumbnail(image_path):
+    """Decode an image at thumbnail size, JPEG files are decoded at reduced scale directly"""
+    reader = QImageReader(image_path)
+    size = reader.size()
+    if size.isValid():
+        reader.setScaledSize(size.scaled(THUMB_SIZE, THUMB_SIZE, Qt.KeepAspectRatio))
+    image = reader.read()
+    if image.isNull():
+        return None
+    if image.width() > THUMB_SIZE or image.height() > THUMB_SIZE:
+        image = image.scaled(THUMB_SIZE, THUMB_SIZE, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+    return image.convertToFormat(QImage.Format_RGB888)
+
+class ThumbnailCache:
+    """Thumbnails of a dataset in a single memory-mapped file, keyed by image path and mtime
+
+    The cache file is only created when the first thumbnail is stored.
+    """
+    def __init__(self, dataset_folder):
+        self.cache_path = os.path.join(dataset_folder, CACHE_FILENAME)
+        self.index_path = os.path.join(dataset_folder, INDEX_FILENAME)
+        self.lock = threading.Lock()
+        self.index = {}  # abs path -> [mtime_ns, slot]
+        self.unsaved = 0
+        self.closed = False
+
+        if os.path.exists(self.index_path) and os.path.exists(self.cache_path):
+            try:
+                with open(self.index_path, 'r') as f:
+                    self.index = json.load(f)
+            except (OSError, ValueError):
+                self.index = {}
+        self.slot_count = max((slot for _, slot in self.index.values()), default=-1) + 1
+
+        self.file = None
+        self.capacity = 0
+        self.mm = None
+
+    def _ensure_capacity(self, slots):
+        """Open, grow and remap the cache file so it holds at least `slots` slots (lock must be held)"""
+        if self.file is None:
+            self.file = open(self.cache_path, 'a+b')
+        current = os.fstat(self.file.fileno()).st_size // SLOT_BYTES
+        if current < slots:
+            current = max(current, INITIAL_SLOTS)
+            while current < slots:
+                current += min(current, GROW_SLOTS)
+            self.file.truncate(current * SLOT_BYTES)
+        if current != self.capacity:
+            if self.mm is not None:
+                self.mm.close()
+            self.mm = mmap.mmap(self.file.fileno(), current * SLOT_BYTES)
+            self.capacity = current
+
+    def get(self, image_path, mtime=None):
+        """Return the cached thumbnail as a QImage, or None when it is missing or outdated"""
+        key = os.path.abspath(image_path)
+        if mtime is None:
+            mtime = os.stat(key).st_mtime_ns
+        with self.lock:
+            entry = self.index.get(key)
+            if self.closed or not entry or entry[0] != mtime:
+                return None
+            if self.mm is None:
+                self._ensure_capacity(self.slot_count)
+            offset = entry[1] * SLOT_BYTES
+            width, height = SLOT_HEADER.unpack_from(self.mm, offset)
+            start = offset + SLOT_HEADER.size
+            pixels = self.mm[start:start + width * height * 3]
+        image = QImage(pixels, width, height, width * 3, QImage.Format_RGB888)
+        # Detach from the bytes object the QImage was created on
+        return image.copy()
+
+    def put(self, image_path, mtime, image):
+        """Store a RGB888 thumbnail, reusing the slot of an outdated entry for the same image"""
+        key = os.path.abspath(image_path)
+        width, height = image.width(), image.height()
+        # Drop any row padding so the slot holds tightly packed pixels
+        pixels = b''.join(image.constScanLine(y).asstring(width * 3) for y in range(height))
+
+        with self.lock:
+            # A worker may still finish a thumbnail after the dataset was switched
+            if self.closed:
+                return
+            entry = self.index.get(key)
+            if entry:
+                slot = entry[1]
+            else:
+                slot = self.slot_count
+                self.slot_count += 1
+                self._ensure_capacity(self.slot_count)
+            offset = slot * SLOT_BYTES
+            SLOT_HEADER.pack_into(self.mm, offset, width, height)
+            start = offset + SLOT_HEADER.size
+            self.mm[start:start + len(pixels)] = pixels
+            self.index[key] = [mtime, slot]
+            self.unsaved += 1
+
+    def save(self):
+        """Flush the thumbnails and write the index"""
+        with self.lock:
+            if self.closed or not self.unsaved:
+                return
+            self.mm.flush()
+            tmp_path = self.index_path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(self.index, f)
+            os.replace(tmp_path, self.index_path)
+            self.unsaved = 0
+
+    def close(self):
+        self.save()
+        with self.lock:
+            self.closed = True
+            if self.mm is not None:
+                self.mm.close()
+            if self.file is not None:
+                self.file.close()
+
+class ThumbnailModel(QAbstractListModel):
+    """List model over the images of a folder, thumbnails are only produced for rows the view asks for"""
+    thumbnail_ready = pyqtSignal(int)
+
+    def __init__(self, parent=None, pixmap_cache_size=512):
+        super().__init__(parent)
+        self.paths = []
+        self.rows = {}
+        self.cache = None
+        self.pixmaps = OrderedDict()  # row -> QPixmap of recently painted items
+        self.pixmap_cache_size = pixmap_cache_size
+
+        self.placeholder = QPixmap(THUMB_SIZE, THUMB_SIZE)
+        self.placeholder.fill(QColor(220, 220, 220))
+
+        # Rows waiting for a thumbnail, the newest request (the visible item) is handled first
+        self.pending_rows = set()
+        self.pending_lock = threading.Lock()
+        self.generation = 0
+        self.group = ('thumbnails', id(self))
+
+        self.thumbnail_ready.connect(self._on_thumbnail_ready)
+
+    def set_images(self, paths, cache):
+        self.beginResetModel()
+        # Thumbnails of the previous folder are no longer needed
+        get_scheduler().cancel_group(self.group)
+        with self.pending_lock:
+            self.generation += 1
+            self.pending_rows.clear()
+        self.paths = paths
+        self.rows = {path: row for row, path in enumerate(paths)}
+        self.cache = cache
+        self.pixmaps.clear()
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.paths)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = index.row()
+        if role == Qt.DisplayRole:
+            return os.path.basename(self.paths[row])
+        if role == Qt.ToolTipRole:
+            return self.paths[row]
+        if role == Qt.DecorationRole:
+            return self._pixmap(row)
+        return None
+
+    def _pixmap(self, row):
+        pixmap = self.pixmaps.get(row)
+        if pixmap is not None:
+            self.pixmaps.move_to_end(row)
+            return pixmap
+
+        try:
+            image = self.cache.get(self.paths[row])
+        except OSError:
+            return self.placeholder
+        if image is None:
+            self._request(row)
+            return self.placeholder
+
+        pixmap = QPixmap.fromImage(image)
+        self.pixmaps[row] = pixmap
+        while len(self.pixmaps) > self.pixmap_cache_size:
+            self.pixmaps.popitem(last=False)
+        return pixmap
+
+    def _request(self, row):
+        with self.pending_lock:
+            if row in self.pending_rows:
+                return
+            self.pending_rows.add(row)
+        get_scheduler().submit(self._generate, row, self.generation, self.paths[row], self.cache,
+                               priority=THUMBNAIL, group=self.group, newest_first=True)
+
+    def _generate(self, row, generation, path, cache):
+        """Create and store one thumbnail (runs on the scheduler)"""
+        try:
+            mtime = os.stat(path).st_mtime_ns
+            image = generate_thumbnail(path)
+        except OSError:
+            image = None
+        if image is not None:
+            cache.put(path, mtime, image)
+            if cache.unsaved >= 256:
+                cache.save()
+
+        with self.pending_lock:
+            if generation != self.generation:
+                return
+            self.pending_rows.discard(row)
+        if image is not None:
+            self.thumbnail_ready.emit(row)
+
+    def _on_thumbnail_ready(self, row):
+        index = self.index(row)
+        self.dataChanged.emit(index, index, [Qt.DecorationRole])
+
+class ThumbnailStrip(QListView):
+    """Horizontal filmstrip of the images in a folder, only the visible thumbnails are painted"""
+    image_activated = pyqtSignal(str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.thumbnail_model = ThumbnailModel(self)
+        self.setModel(self.thumbnail_model)
+        self.folder = None
+        self.cache = None
+
+        self.setViewMode(QListView.IconMode)
+        self.setFlow(QListView.LeftToRight)
+        self.setWrapping(False)
+        self.setMovement(QListView.Static)
+        self.setIconSize(QSize(THUMB_SIZE, THUMB_SIZE))
+        self.setGridSize(QSize(THUMB_SIZE + 16, THUMB_SIZE + 24))
+        # Uniform sizes let the view lay out 100k items without asking for each one
+        self.setUniformItemSizes(True)
+        self.setLayoutMode(QListView.Batched)
+        self.setBatchSize(500)
+        self.setFixedHeight(THUMB_SIZE + 48)
+
+        self.clicked.connect(lambda index: self.image_activated.emit(self.thumbnail_model.paths[index.row()]))
+
+    def set_folder(self, image_folder, dataset_folder):
+        """Show the images of a folder, using the thumbnail cache of its dataset
+
+        Folders without images are ignored, so browsing them never creates cache files.
+        """
+        if image_folder == self.folder:
+            return
+        with os.scandir(image_folder) as entries:
+            paths = sorted(entry.path for entry in entries
+                           if entry.is_file() and entry.name.lower().endswith(IMAGE_EXTENSIONS))
+        if not paths:
+            return
+
+        if self.cache is not None and self.cache.cache_path != os.path.join(dataset_folder, CACHE_FILENAME):
+            self.cache.close()
+            self.cache = None
+        if self.cache is None:
+            self.cache = ThumbnailCache(dataset_folder)
+        self.folder = image_folder
+        self.thumbnail_model.set_images(paths, self.cache)
+
+    def select_image(self, image_path):
+        row = self.thumbnail_model.rows.get(image_path)
+        if row is not None:
+            index = self.thumbnail_model.index(row)
+            self.setCurrentIndex(index)
+            self.scrollTo(index)
+
+    def close(self):
+        if self.cache is not None:
+            self.cache.close()
+            self.cache = None
+        return super().close()
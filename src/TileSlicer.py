@@ -0,0 +1,207 @@
+import os
+import json
+import argparse
+import multiprocessing
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from PIL import Image
+
+from LabelIO import index_images, read_boxes_array
+
+MANIFEST_FILENAME = '.tiles_manifest.json'
+BATCH_SIZE = 256  # Images handed to the worker pool at once
+# PIL saves JPEG at quality 75 by default, tiles are training data so they are kept close to the source
+JPEG_SAVE_OPTIONS = {'quality': 95, 'subsampling': 0}
+
+def tile_origins(length, size, stride):
+    """Start offsets along one axis, the last tile is shifted back so it ends at the image border"""
+    if length <= size:
+        return [0]
+    origins = list(range(0, length - size + 1, stride))
+    if origins[-1] + size < length:
+        origins.append(length - size)
+    return origins
+
+def tile_grid(width, height, size, stride):
+    """Return [t, 4] tile corners x1, y1, x2, y2 in pixels"""
+    tiles = [(x, y, min(x + size, width), min(y + size, height))
+             for y in tile_origins(height, size, stride)
+             for x in tile_origins(width, size, stride)]
+    return np.asarray(tiles, dtype=np.float32)
+
+def clip_boxes(boxes, width, height, tiles, min_visibility):
+    """Clip YOLO boxes to every tile at once and renormalize them to tile coordinates
+
+    Returns a list with a [n, 5] array per tile. Boxes that keep less than
+    min_visibility of their area inside a tile are dropped from that tile.
+    """
+    if len(boxes) == 0:
+        return [np.zeros((0, 5), dtype=np.float32) for _ in tiles]
+
+    scale = np.array([width, height], dtype=np.float32)
+    centers = boxes[:, 1:3] * scale
+    half = boxes[:, 3:5] * scale / 2
+    corners = np.concatenate([centers - half, centers + half], axis=1)  # [n, 4]
+
+    # [t, n, 2] clipped corners of every box inside every tile
+    top_left = np.maximum(corners[None, :, :2], tiles[:, None, :2])
+    bottom_right = np.minimum(corners[None, :, 2:], tiles[:, None, 2:])
+    clipped_size = np.clip(bottom_right - top_left, 0, None)
+    clipped_area = clipped_size[..., 0] * clipped_size[..., 1]
+    box_area = np.prod(corners[:, 2:] - corners[:, :2], axis=1)
+    visible = (clipped_area > 0) & (clipped_area >= min_visibility * box_area[None, :])
+
+    tile_size = tiles[:, None, 2:] - tiles[:, None, :2]
+    normalized_center = ((top_left + bottom_right) / 2 - tiles[:, None, :2]) / tile_size
+    normalized_size = clipped_size / tile_size
+    rows = np.concatenate([
+        np.broadcast_to(boxes[None, :, :1], visible.shape + (1,)),
+        normalized_center,
+        normalized_size
+    ], axis=2)
+    return [rows[t][visible[t]] for t in range(len(tiles))]
+
+def slice_image(job):
+    """Cut one image into tiles and write the tiles with their labels (runs in a worker process)
+
+    Returns (stem, tile names, box count, error). A failing image returns None as tile
+    names and the error message, so one corrupt file does not abort the whole run.
+    """
+    image_path, label_path, output_folder, size, stride, min_visibility, skip_empty = job
+    stem, ext = os.path.splitext(os.path.basename(image_path))
+    tile_names = []
+    try:
+        box_count = _write_tiles(image_path, label_path, output_folder, size, stride, min_visibility,
+                                 skip_empty, tile_names)
+    except Exception as e:
+        # Do not leave half of the tiles of a failed image behind
+        remove_tiles(output_folder, tile_names)
+        return stem, None, 0, str(e)
+    return stem, tile_names, box_count, None
+
+def _write_tiles(image_path, label_path, output_folder, size, stride, min_visibility, skip_empty, tile_names):
+    """Write the tiles of one image, appending every written tile to tile_names"""
+    stem, ext = os.path.splitext(os.path.basename(image_path))
+    boxes = read_boxes_array(label_path) if os.path.exists(label_path) else np.zeros((0, 5), dtype=np.float32)
+
+    box_count = 0
+    save_options = JPEG_SAVE_OPTIONS if ext.lower() in ('.jpg', '.jpeg') else {}
+    with Image.open(image_path) as img:
+        width, height = img.size
+        tiles = tile_grid(width, height, size, stride)
+        tile_boxes = clip_boxes(boxes, width, height, tiles, min_visibility)
+        # PNG and JPEG have no random access, so the image is decoded once and every tile is cut from it
+        img.load()
+        for (x1, y1, x2, y2), rows in zip(tiles.astype(int), tile_boxes):
+            if skip_empty and len(rows) == 0:
+                continue
+            name = f"{stem}_{x1}_{y1}"
+            tile_names.append(name + ext)
+            img.crop((x1, y1, x2, y2)).save(os.path.join(output_folder, "images", name + ext), **save_options)
+            with open(os.path.join(output_folder, "labels", name + ".txt"), 'w') as f:
+                for class_id, x_center, y_center, box_width, box_height in rows:
+                    f.write(f"{int(class_id)} {x_center:.6f} {y_center:.6f} {box_width:.6f} {box_height:.6f}\n")
+            box_count += len(rows)
+    return box_count
+
+def remove_tiles(output_folder, tile_names):
+    for name in tile_names:
+        for path in (os.path.join(output_folder, "images", name),
+                     os.path.join(output_folder, "labels", os.path.splitext(name)[0] + ".txt")):
+            if os.path.exists(path):
+                os.remove(path)
+
+def save_manifest(manifest_path, manifest):
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, manifest_path)
+
+def slice_dataset(dataset_folder, output_folder, size=640, stride=512, min_visibility=0.25,
+                  skip_empty=False, workers=None):
+    """Slice every image of a dataset into overlapping tiles, only images or labels that changed are redone"""
+    images_folder = os.path.join(dataset_folder, "images")
+    labels_folder = os.path.join(dataset_folder, "labels")
+    os.makedirs(os.path.join(output_folder, "images"), exist_ok=True)
+    os.makedirs(os.path.join(output_folder, "labels"), exist_ok=True)
+
+    params = {'size': size, 'stride': stride, 'min_visibility': min_visibility, 'skip_empty': skip_empty}
+    manifest_path = os.path.join(output_folder, MANIFEST_FILENAME)
+    manifest = {'params': params, 'images': {}}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r') as f:
+            previous = json.load(f)
+        # Different tiling parameters invalidate every tile
+        if previous.get('params') == params:
+            manifest = previous
+        else:
+            for entry in previous.get('images', {}).values():
+                remove_tiles(output_folder, entry['tiles'])
+
+    image_index = index_images(images_folder)
+    done = manifest['images']
+    for stem in [stem for stem in done if stem not in image_index]:
+        remove_tiles(output_folder, done.pop(stem)['tiles'])
+
+    def jobs():
+        for stem, image_path in sorted(image_index.items()):
+            label_path = os.path.join(labels_folder, f"{stem}.txt")
+            image_mtime = os.stat(image_path).st_mtime_ns
+            label_mtime = os.stat(label_path).st_mtime_ns if os.path.exists(label_path) else None
+            entry = done.get(stem)
+            if entry and entry['image_mtime'] == image_mtime and entry['label_mtime'] == label_mtime:
+                continue
+            if entry:
+                remove_tiles(output_folder, entry['tiles'])
+            done[stem] = {'image_mtime': image_mtime, 'label_mtime': label_mtime, 'tiles': []}
+            yield image_path, label_path, output_folder, size, stride, min_visibility, skip_empty
+
+    sliced = 0
+    failed = 0
+    tile_count = 0
+    box_count = 0
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        job_iter = jobs()
+        while True:
+            batch = list(islice(job_iter, BATCH_SIZE))
+            if not batch:
+                break
+            for stem, tile_names, boxes, error in pool.map(slice_image, batch):
+                if error is not None:
+                    # Leave the image out of the manifest so the next run retries it
+                    print(f"Could not slice {stem}: {error}")
+                    done.pop(stem, None)
+                    failed += 1
+                    continue
+                done[stem]['tiles'] = tile_names
+                sliced += 1
+                tile_count += len(tile_names)
+                box_count += boxes
+
+            # Save progress after every batch so an interrupted run resumes where it stopped
+            save_manifest(manifest_path, manifest)
+
+    save_manifest(manifest_path, manifest)
+
+    print(f"Sliced {sliced} changed images into {tile_count} tiles with {box_count} boxes "
+          f"({len(image_index) - sliced - failed} images unchanged, {failed} failed)")
+    return sliced, tile_count
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Slice the images of a dataset into overlapping training tiles",
+                                     epilog="Tiles keep the format of their image, JPEG tiles are saved "
+                                            "at quality 95 without chroma subsampling.")
+    parser.add_argument('dataset', nargs='?', default='Datasets/Stag', help="Dataset folder containing images/ and labels/")
+    parser.add_argument('--output', help="Output dataset folder, defaults to <dataset>_tiles")
+    parser.add_argument('--size', type=int, default=640, help="Tile size in pixels")
+    parser.add_argument('--stride', type=int, default=512, help="Distance between tiles in pixels")
+    parser.add_argument('--min-visibility', type=float, default=0.25,
+                        help="Minimum fraction of a box that has to be inside a tile to keep it")
+    parser.add_argument('--skip-empty', action='store_true', help="Do not write tiles without boxes")
+    parser.add_argument('--workers', type=int, default=None, help="Number of worker processes")
+    args = parser.parse_args()
+
+    output = args.output or os.path.normpath(args.dataset) + "_tiles"
+    slice_dataset(args.dataset, output, args.size, args.stride, args.min_visibility, args.skip_empty, args.workers)
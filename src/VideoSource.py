@@ -0,0 +1,224 @@
+import os
+import json
+import threading
+from collections import OrderedDict
+import cv2
+
+from TaskScheduler import get_scheduler, PREFETCH, BATCH
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.webm')
+
+# The seek index is stored next to the video as <video>.seekindex.json
+SEEK_INDEX_SUFFIX = '.seekindex.json'
+ANCHOR_INTERVAL = 30  # Frames between seek anchors
+FRAME_CACHE_BYTES = 256 * 1024 * 1024  # Memory budget of the decoded frame cache
+
+def is_video_file(file_path):
+    return file_path.lower().endswith(VIDEO_EXTENSIONS)
+
+def frame_stem(video_path, frame_id):
+    """Name used for the labels and exported image of a single video frame"""
+    stem = os.path.splitext(os.path.basename(video_path))[0]
+    return f"{stem}_{frame_id:06d}"
+
+def build_seek_index(video_path, interval=ANCHOR_INTERVAL):
+    """Scan a video once and record the exact frame count plus timestamps of anchor frames
+
+    OpenCV does not expose keyframe flags, so anchors are placed every `interval`
+    frames. Seeking jumps to the nearest anchor and grabs forward from there.
+    """
+    capture = cv2.VideoCapture(video_path)
+    if not capture.isOpened():
+        raise IOError(f"Could not open video: {video_path}")
+
+    anchors = []  # [frame_id, msec]
+    frame_count = 0
+    try:
+        while True:
+            # grab() advances without converting the frame to a BGR image
+            if not capture.grab():
+                break
+            if frame_count % interval == 0:
+                # POS_MSEC is the timestamp of the last grabbed frame, so it is read after grab()
+                anchors.append([frame_count, capture.get(cv2.CAP_PROP_POS_MSEC)])
+            frame_count += 1
+        fps = capture.get(cv2.CAP_PROP_FPS)
+    finally:
+        capture.release()
+
+    stat = os.stat(video_path)
+    return {
+        'mtime': stat.st_mtime_ns,
+        'size': stat.st_size,
+        'frame_count': frame_count,
+        'fps': fps,
+        'interval': interval,
+        'anchors': anchors
+    }
+
+def load_seek_index(video_path):
+    """Load the persisted seek index of a video, or None when it is missing or stale"""
+    index_path = video_path + SEEK_INDEX_SUFFIX
+    if not os.path.exists(index_path):
+        return None
+    try:
+        with open(index_path, 'r') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    stat = os.stat(video_path)
+    if index.get('mtime') != stat.st_mtime_ns or index.get('size') != stat.st_size:
+        return None
+    return index
+
+def save_seek_index(video_path, index):
+    tmp_path = video_path + SEEK_INDEX_SUFFIX + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(index, f)
+    os.replace(tmp_path, video_path + SEEK_INDEX_SUFFIX)
+
+class VideoFrameSource:
+    """Random access to the frames of a video with a bounded LRU cache and read-ahead
+
+    The cache is bounded by the bytes of the decoded frames, not their count, so 4K
+    videos keep fewer frames than small ones. Read-ahead is capped to half of the budget
+    so prefetched frames never push out the frames around the current one.
+    """
+    def __init__(self, video_path, cache_bytes=FRAME_CACHE_BYTES, read_ahead=8):
+        self.video_path = video_path
+        self.cache_bytes = cache_bytes
+
+        self.capture = cv2.VideoCapture(video_path)
+        if not self.capture.isOpened():
+            raise IOError(f"Could not open video: {video_path}")
+        frame_bytes = max(1, int(self.capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+                          * int(self.capture.get(cv2.CAP_PROP_FRAME_HEIGHT)) * 3)
+        self.read_ahead = max(0, min(read_ahead, cache_bytes // 2 // frame_bytes))
+        self.capture_lock = threading.Lock()  # The decoder is not thread safe
+        self.position = 0  # Frame id the next read() will return
+
+        self.cache = OrderedDict()  # frame_id -> BGR numpy array
+        self.cached_bytes = 0
+        self.cache_lock = threading.Lock()
+        self.read_ahead_generation = 0  # Bumped to stop a running read-ahead
+        self.read_ahead_group = ('read_ahead', id(self))
+
+        self.index_future = None  # Future of the background index build, None when the index was loaded
+        self.index = load_seek_index(video_path)
+        if self.index is None:
+            # Use the container's estimate until the exact index has been built
+            self.index = {
+                'frame_count': int(self.capture.get(cv2.CAP_PROP_FRAME_COUNT)),
+                'fps': self.capture.get(cv2.CAP_PROP_FPS),
+                'interval': ANCHOR_INTERVAL,
+                'anchors': []
+            }
+            # Scanning the whole video is a batch job, it runs in a worker process
+            self.index_future = get_scheduler().submit_process(build_seek_index, video_path, priority=BATCH)
+            self.index_future.add_done_callback(self._on_index_built)
+
+    @property
+    def frame_count(self):
+        return self.index['frame_count']
+
+    def _on_index_built(self, future):
+        if future.cancelled():
+            return
+        try:
+            index = future.result()
+            save_seek_index(self.video_path, index)
+            self.index = index
+        except Exception as e:
+            print(f"Could not build seek index for {self.video_path}: {str(e)}")
+
+    def _cached(self, frame_id):
+        with self.cache_lock:
+            frame = self.cache.get(frame_id)
+            if frame is not None:
+                self.cache.move_to_end(frame_id)
+            return frame
+
+    def _store(self, frame_id, frame):
+        with self.cache_lock:
+            previous = self.cache.pop(frame_id, None)
+            if previous is not None:
+                self.cached_bytes -= previous.nbytes
+            self.cache[frame_id] = frame
+            self.cached_bytes += frame.nbytes
+            # Always keep the newest frame, even when it alone is over the budget
+            while self.cached_bytes > self.cache_bytes and len(self.cache) > 1:
+                _, evicted = self.cache.popitem(last=False)
+                self.cached_bytes -= evicted.nbytes
+
+    def _seek(self, frame_id):
+        """Position the decoder so the next read() returns frame_id (capture_lock must be held)"""
+        interval = self.index['interval']
+        # Short forward jumps are cheaper to decode through than to seek
+        if not (self.position <= frame_id < self.position + interval):
+            # Seek by frame number, OpenCV converts POS_MSEC back to a frame number with the
+            # nominal fps anyway, so timestamps would not land more exactly
+            anchor = frame_id - frame_id % interval
+            self.capture.set(cv2.CAP_PROP_POS_FRAMES, anchor)
+            self.position = anchor
+        while self.position < frame_id:
+            if not self.capture.grab():
+                return False
+            self.position += 1
+        return True
+
+    def _decode(self, frame_id):
+        """Decode a single frame into the cache"""
+        with self.capture_lock:
+            frame = self._cached(frame_id)
+            if frame is not None:
+                return frame
+            if not self._seek(frame_id):
+                return None
+            ok, frame = self.capture.read()
+            if not ok:
+                # Force a real seek next time, the decoder state is unknown
+                self.position = -self.index['interval']
+                return None
+            self.position += 1
+        self._store(frame_id, frame)
+        return frame
+
+    def read_frame(self, frame_id):
+        """Return frame_id as a BGR numpy array (or None) and start reading ahead of it"""
+        scheduler = get_scheduler()
+        # Read-ahead of a frame the user already moved past is no longer useful
+        scheduler.cancel_group(self.read_ahead_group)
+        self.read_ahead_generation += 1
+        frame = self._cached(frame_id)
+        if frame is None:
+            frame = self._decode(frame_id)
+
+        if frame is not None and self.read_ahead > 0:
+            scheduler.submit(self._read_ahead, frame_id, self.read_ahead_generation,
+                             priority=PREFETCH, group=self.read_ahead_group)
+        return frame
+
+    def _read_ahead(self, frame_id, generation):
+        last = min(frame_id + self.read_ahead, self.frame_count - 1)
+        for next_id in range(frame_id + 1, last + 1):
+            # Stop as soon as the user asked for another frame
+            if generation != self.read_ahead_generation:
+                return
+            if self._cached(next_id) is None and self._decode(next_id) is None:
+                return
+
+    def materialize_frame(self, frame_id, output_path):
+        """Write a single frame to disk as an image, used when a labeled frame is exported"""
+        frame = self.read_frame(frame_id)
+        if frame is None or not cv2.imwrite(output_path, frame):
+            raise IOError(f"Could not write frame {frame_id} to {output_path}")
+
+    def release(self):
+        get_scheduler().cancel_group(self.read_ahead_group)
+        self.read_ahead_generation += 1
+        with self.capture_lock:
+            self.capture.release()
+        with self.cache_lock:
+            self.cache.clear()
+            self.cached_bytes = 0
@@ -0,0 +1,71 @@
+import os
+import csv
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import CompareLabels
+from CompareLabels import iou_matrix, match_boxes, consensus_boxes, compare_label_sets
+
+def boxes(*rows):
+    return np.asarray(rows, dtype=np.float32).reshape(-1, 5)
+
+@pytest.fixture
+def greedy(monkeypatch):
+    """Use the greedy matcher, the only one available without scipy"""
+    monkeypatch.setattr(CompareLabels, 'linear_sum_assignment', None)
+
+def test_iou_of_known_boxes():
+    reference = boxes([0, 0.5, 0.5, 0.2, 0.2])
+    others = boxes(
+        [0, 0.5, 0.5, 0.2, 0.2],  # Same box
+        [0, 0.6, 0.5, 0.2, 0.2],  # Half overlap: 0.02 / 0.06
+        [0, 0.9, 0.9, 0.1, 0.1],  # Disjoint
+    )
+    np.testing.assert_allclose(iou_matrix(reference, others), [[1.0, 1 / 3, 0.0]], atol=1e-6)
+    assert iou_matrix(reference, boxes()).shape == (1, 0)
+
+def test_greedy_matching_is_one_to_one_and_respects_threshold(greedy):
+    ious = np.asarray([[0.9, 0.8],
+                       [0.85, 0.1]], dtype=np.float32)
+    rows, cols = match_boxes(ious, 0.5)
+    # Column 0 is taken by the best pair, the remaining pair is below the threshold
+    assert rows.tolist() == [0]
+    assert cols.tolist() == [0]
+
+    rows, cols = match_boxes(np.asarray([[0.9, 0.0], [0.0, 0.6]], dtype=np.float32), 0.5)
+    assert sorted(zip(rows.tolist(), cols.tolist())) == [(0, 0), (1, 1)]
+
+def test_consensus_uses_min_votes_and_class_majority(greedy):
+    shared = [0.5, 0.5, 0.2, 0.2]
+    box_sets = [
+        boxes([1] + shared, [0, 0.1, 0.1, 0.05, 0.05]),  # Second box only drawn by one annotator
+        boxes([1, 0.52, 0.5, 0.2, 0.2]),
+        boxes([2, 0.48, 0.5, 0.2, 0.2]),
+    ]
+    merged = consensus_boxes(box_sets, threshold=0.5, min_votes=2)
+    np.testing.assert_allclose(merged, [[1] + shared], atol=1e-6)
+
+    assert len(consensus_boxes(box_sets, threshold=0.5, min_votes=1)) == 2
+
+def test_image_missing_from_one_annotator(tmp_path):
+    folder_a = tmp_path / "a"
+    folder_b = tmp_path / "b"
+    folder_a.mkdir()
+    folder_b.mkdir()
+    (folder_a / "img1.txt").write_text("0 0.5 0.5 0.2 0.2\n")
+    (folder_a / "img2.txt").write_text("0 0.5 0.5 0.2 0.2\n")
+    (folder_b / "img1.txt").write_text("0 0.5 0.5 0.2 0.2\n")
+
+    output = tmp_path / "out"
+    summary = compare_label_sets([str(folder_a), str(folder_b)], str(output), min_votes=2, workers=1)
+
+    assert summary['images'] == 2
+    assert summary['pairs']['a-b']['matched'] == 1
+    assert summary['pairs']['a-b']['agreement'] == pytest.approx(2 / 3)
+    with open(output / "per_image.csv", newline='') as f:
+        rows = {row['image']: row for row in csv.DictReader(f)}
+    assert rows['img2']['boxes_a'] == '1'
+    assert rows['img2']['boxes_b'] == '0'
+    assert rows['img2']['consensus_boxes'] == '0'
+    assert os.path.getsize(output / "labels" / "img2.txt") == 0
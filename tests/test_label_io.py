@@ -0,0 +1,15 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+from LabelIO import LabelCache
+
+def test_label_cache_rescales_yolo_boxes_per_image_size(tmp_path):
+    (tmp_path / "frame.txt").write_text("0 0.5 0.5 0.5 0.5\n")
+    cache = LabelCache()
+
+    small = cache.get(str(tmp_path), "frame", lambda: (100, 100))
+    large = cache.get(str(tmp_path), "frame", lambda: (400, 200))
+
+    assert small == [{'label': '0', 'x': 25, 'y': 25, 'width': 50, 'height': 50}]
+    assert large == [{'label': '0', 'x': 100, 'y': 50, 'width': 200, 'height': 100}]
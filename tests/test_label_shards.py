@@ -0,0 +1,70 @@
+import os
+import json
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from LabelShards import LabelShard, build_shard, INDEX_FILE
+
+def write_labels(folder, stem, rows, mtime=None):
+    path = os.path.join(folder, f"{stem}.txt")
+    with open(path, 'w') as f:
+        for row in rows:
+            f.write(" ".join(str(v) for v in row) + "\n")
+    if mtime is not None:
+        os.utime(path, ns=(mtime, mtime))
+
+def assert_same_shard(shard_a, shard_b):
+    assert shard_a.stems == shard_b.stems
+    assert shard_a.mtimes == shard_b.mtimes
+    np.testing.assert_array_equal(shard_a.offsets, shard_b.offsets)
+    np.testing.assert_array_equal(shard_a.boxes, shard_b.boxes)
+
+def test_incremental_rebuild_matches_full_rebuild(tmp_path):
+    labels = str(tmp_path / "labels")
+    os.makedirs(labels)
+    write_labels(labels, "a", [(0, 0.1, 0.1, 0.1, 0.1), (1, 0.2, 0.2, 0.2, 0.2)], mtime=1_000)
+    write_labels(labels, "b", [(0, 0.5, 0.5, 0.3, 0.3)], mtime=1_000)
+    write_labels(labels, "c", [], mtime=1_000)
+    write_labels(labels, "d", [(2, 0.7, 0.7, 0.1, 0.2)], mtime=1_000)
+
+    incremental = str(tmp_path / "shards" / "incremental")
+    build_shard(labels, incremental)
+
+    # Touch one label with a different box count and add a new image
+    write_labels(labels, "b", [(3, 0.4, 0.4, 0.1, 0.1), (3, 0.6, 0.6, 0.1, 0.1)], mtime=2_000)
+    write_labels(labels, "e", [(4, 0.9, 0.9, 0.05, 0.05)], mtime=2_000)
+    images, changed = build_shard(labels, incremental)
+    assert (images, changed) == (5, 2)
+
+    full = str(tmp_path / "shards" / "full")
+    build_shard(labels, full)
+    shard = LabelShard(incremental)
+    assert_same_shard(shard, LabelShard(full))
+    np.testing.assert_allclose(shard.get("b")[:, 0], [3, 3])
+    assert len(shard.get("c")) == 0
+    assert not os.path.exists(incremental + ".building")
+    assert not os.path.exists(incremental + ".previous")
+
+def test_inconsistent_shard_is_rebuilt(tmp_path):
+    labels = str(tmp_path / "labels")
+    os.makedirs(labels)
+    write_labels(labels, "a", [(0, 0.1, 0.1, 0.1, 0.1)], mtime=1_000)
+    write_labels(labels, "b", [(1, 0.5, 0.5, 0.3, 0.3)], mtime=1_000)
+    shard_folder = str(tmp_path / "shard")
+    build_shard(labels, shard_folder)
+
+    # Simulate an index that does not belong to the arrays next to it
+    index_path = os.path.join(shard_folder, INDEX_FILE)
+    with open(index_path) as f:
+        index = json.load(f)
+    index['stems'] = index['stems'][:1]
+    index['mtimes'] = index['mtimes'][:1]
+    with open(index_path, 'w') as f:
+        json.dump(index, f)
+    with pytest.raises(ValueError):
+        LabelShard(shard_folder)
+
+    images, changed = build_shard(labels, shard_folder)
+    assert (images, changed) == (2, 2)
+    assert LabelShard(shard_folder).stems == ["a", "b"]
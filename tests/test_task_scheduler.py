@@ -0,0 +1,80 @@
+import threading
+import pytest
+
+from TaskScheduler import TaskScheduler, FOREGROUND, PREFETCH, THUMBNAIL, BATCH
+
+@pytest.fixture
+def scheduler():
+    scheduler = TaskScheduler(threads=1, processes=1)
+    yield scheduler
+    scheduler.shutdown()
+
+def block(scheduler):
+    """Occupy the single worker thread until the returned event is set"""
+    started = threading.Event()
+    release = threading.Event()
+
+    def wait():
+        started.set()
+        release.wait(10)
+
+    future = scheduler.submit(wait, priority=FOREGROUND)
+    assert started.wait(10)
+    return future, release
+
+def test_priority_classes_run_in_order(scheduler):
+    _, release = block(scheduler)
+    order = []
+    futures = [scheduler.submit(order.append, priority, priority=priority)
+               for priority in (BATCH, THUMBNAIL, PREFETCH, FOREGROUND)]
+    release.set()
+    for future in futures:
+        future.result(10)
+    assert order == [FOREGROUND, PREFETCH, THUMBNAIL, BATCH]
+
+def test_newest_first_within_a_class(scheduler):
+    _, release = block(scheduler)
+    order = []
+    futures = [scheduler.submit(order.append, i, priority=THUMBNAIL, newest_first=True) for i in range(4)]
+    release.set()
+    for future in futures:
+        future.result(10)
+    assert order == [3, 2, 1, 0]
+
+def test_cancel_group_leaves_running_tasks(scheduler):
+    started = threading.Event()
+    release = threading.Event()
+
+    def wait():
+        started.set()
+        release.wait(10)
+        return 'done'
+
+    running = scheduler.submit(wait, priority=FOREGROUND, group='images')
+    assert started.wait(10)
+    queued = [scheduler.submit(lambda: None, group='images') for _ in range(3)]
+
+    assert scheduler.cancel_group('images') == 3
+    assert all(future.cancelled() for future in queued)
+    assert scheduler.metrics()['cancelled'] == 3
+
+    release.set()
+    assert running.result(10) == 'done'
+
+def test_metrics_report_queue_depth(scheduler):
+    _, release = block(scheduler)
+    futures = [scheduler.submit(lambda: None, priority=PREFETCH) for _ in range(2)]
+    futures.append(scheduler.submit(lambda: None, priority=BATCH))
+
+    metrics = scheduler.metrics()['threads']
+    assert metrics['running'] == 1
+    assert metrics['queued'] == {'foreground': 0, 'prefetch': 2, 'thumbnail': 0, 'batch': 1}
+
+    release.set()
+    for future in futures:
+        future.result(10)
+
+def test_submit_after_shutdown_raises(scheduler):
+    scheduler.shutdown()
+    with pytest.raises(RuntimeError):
+        scheduler.submit(lambda: None)
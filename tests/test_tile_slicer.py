@@ -0,0 +1,40 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("PIL")
+
+from TileSlicer import clip_boxes, tile_grid
+
+WIDTH, HEIGHT = 1000, 600
+
+def yolo(x1, y1, x2, y2, class_id=0):
+    """YOLO row of a pixel box in the test image"""
+    return [class_id, (x1 + x2) / 2 / WIDTH, (y1 + y2) / 2 / HEIGHT, (x2 - x1) / WIDTH, (y2 - y1) / HEIGHT]
+
+def test_edge_tile_ends_at_image_border():
+    tiles = tile_grid(WIDTH, HEIGHT, 640, 512)
+    # Images smaller than a tile get one tile, the last column is shifted back to the border
+    np.testing.assert_array_equal(tiles, [[0, 0, 640, 600], [360, 0, 1000, 600]])
+
+def test_clip_boxes_renormalizes_and_drops_slivers():
+    tiles = tile_grid(WIDTH, HEIGHT, 640, 512)
+    boxes = np.asarray([
+        yolo(50, 250, 150, 350, class_id=1),   # Only inside the first tile
+        yolo(600, 250, 700, 350, class_id=2),  # 40% inside the first tile, fully inside the second
+        yolo(620, 250, 720, 350, class_id=3),  # 20% inside the first tile, a sliver there
+    ], dtype=np.float32)
+
+    first, second = clip_boxes(boxes, WIDTH, HEIGHT, tiles, min_visibility=0.25)
+
+    np.testing.assert_allclose(first, [
+        [1, 100 / 640, 300 / 600, 100 / 640, 100 / 600],
+        [2, 620 / 640, 300 / 600, 40 / 640, 100 / 600],
+    ], rtol=1e-5)
+    np.testing.assert_allclose(second, [
+        [2, 290 / 640, 300 / 600, 100 / 640, 100 / 600],
+        [3, 310 / 640, 300 / 600, 100 / 640, 100 / 600],
+    ], rtol=1e-5)
+
+def test_clip_boxes_without_boxes():
+    tiles = tile_grid(WIDTH, HEIGHT, 640, 512)
+    assert [len(rows) for rows in clip_boxes(np.zeros((0, 5), dtype=np.float32), WIDTH, HEIGHT, tiles, 0.25)] == [0, 0]
@@ -0,0 +1,70 @@
+import time
+import pytest
+
+np = pytest.importorskip("numpy")
+cv2 = pytest.importorskip("cv2")
+
+from TaskScheduler import shutdown_scheduler
+from VideoSource import VideoFrameSource, build_seek_index
+
+FRAMES = 75
+INTERVAL = 30
+
+def frame_value(frame_id):
+    return frame_id * 3
+
+def write_video(path):
+    """Write a video whose frames are filled with a gray value encoding the frame id"""
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'MJPG'), 25, (64, 48))
+    assert writer.isOpened()
+    for frame_id in range(FRAMES):
+        writer.write(np.full((48, 64, 3), frame_value(frame_id), dtype=np.uint8))
+    writer.release()
+
+def decoded_id(frame):
+    return int(round(frame.mean() / 3))
+
+@pytest.fixture
+def video_path(tmp_path):
+    path = tmp_path / "clip.avi"
+    write_video(path)
+    yield str(path)
+    shutdown_scheduler()
+
+def test_seek_index_anchors(video_path):
+    index = build_seek_index(video_path, INTERVAL)
+    assert index['frame_count'] == FRAMES
+    assert [frame_id for frame_id, _ in index['anchors']] == [0, 30, 60]
+    # Anchor timestamps belong to the anchor frame itself, not to the frame before it
+    assert [round(msec) for _, msec in index['anchors']] == [0, 1200, 2400]
+
+def test_read_frame_returns_the_requested_frame(video_path):
+    # Anchored ids, ids between anchors, backward jumps and short forward steps
+    frame_ids = [0, 30, 60, 29, 31, 59, 61, 74, 45, 46, 47, 10]
+
+    source = VideoFrameSource(video_path, read_ahead=0)
+    before = [decoded_id(source.read_frame(frame_id)) for frame_id in frame_ids]
+    source.index_future.result(timeout=60)
+    while 'mtime' not in source.index:  # The done callback may still be installing the index
+        time.sleep(0.01)
+    with source.cache_lock:
+        source.cache.clear()
+        source.cached_bytes = 0
+    after = [decoded_id(source.read_frame(frame_id)) for frame_id in frame_ids]
+    source.release()
+
+    assert before == frame_ids
+    assert after == frame_ids
+
+def test_frame_cache_is_bounded_by_bytes(video_path):
+    frame_bytes = 64 * 48 * 3
+    source = VideoFrameSource(video_path, cache_bytes=5 * frame_bytes, read_ahead=8)
+    # Read-ahead is limited to half of the budget
+    assert source.read_ahead == 2
+
+    for frame_id in range(20):
+        source.read_frame(frame_id)
+        assert source.cached_bytes <= 5 * frame_bytes
+    with source.cache_lock:
+        assert source.cached_bytes == sum(frame.nbytes for frame in source.cache.values())
+    source.release()